@@ -23,7 +23,11 @@ config.set_main_option('sqlalchemy.url', os.environ['DATABASE_DSN'])
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# The service passes configure_logger=False to keep its own logging setup.
+if (
+    config.config_file_name is not None
+    and config.attributes.get('configure_logger', True)
+):
     fileConfig(config.config_file_name)
 
 # add your model's MetaData object here
@@ -0,0 +1,101 @@
+"""link acl
+
+Revision ID: 3f61c8a2d5e4
+Revises: e5a0d7c3b912
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '3f61c8a2d5e4'
+down_revision: Union[str, None] = 'e5a0d7c3b912'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'long_short_url',
+        sa.Column(
+            'is_public',
+            sa.Boolean,
+            nullable=False,
+            server_default=sa.true()
+        )
+    )
+    op.create_table(
+        'link_acl',
+        sa.Column(
+            'link_id',
+            sa.Integer,
+            sa.ForeignKey('long_short_url.id', ondelete='CASCADE'),
+            primary_key=True
+        ),
+        sa.Column(
+            'username',
+            sa.String(100),
+            primary_key=True
+        ),
+    )
+    op.create_index('ix_link_acl_username', 'link_acl', ['username'])
+
+    # Строка users из url_visibility разбивается на имена:
+    # all задает публичность ссылки, остальные имена
+    # переносятся в список доступа.
+    op.execute(
+        """
+        UPDATE long_short_url
+        SET is_public = 'all' = ANY(string_to_array(v.users, ' '))
+        FROM url_visibility AS v
+        WHERE v.url = long_short_url.url
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO link_acl (link_id, username)
+        SELECT DISTINCT l.id, u.username
+        FROM url_visibility AS v
+        JOIN long_short_url AS l ON l.url = v.url
+        CROSS JOIN unnest(string_to_array(v.users, ' ')) AS u(username)
+        WHERE u.username NOT IN ('all', '')
+        """
+    )
+    op.drop_table('url_visibility')
+
+
+def downgrade() -> None:
+    op.create_table(
+        'url_visibility',
+        sa.Column(
+            'url',
+            sa.String(200),
+            primary_key=True
+        ),
+        sa.Column(
+            'users',
+            sa.String(500),
+            nullable=False
+        ),
+    )
+    op.execute(
+        """
+        INSERT INTO url_visibility (url, users)
+        SELECT
+            l.url,
+            concat_ws(
+                ' ',
+                CASE WHEN l.is_public THEN 'all' END,
+                string_agg(a.username, ' ' ORDER BY a.username)
+            )
+        FROM long_short_url AS l
+        LEFT JOIN link_acl AS a ON a.link_id = l.id
+        GROUP BY l.id, l.url, l.is_public
+        """
+    )
+    op.drop_index('ix_link_acl_username', table_name='link_acl')
+    op.drop_table('link_acl')
+    op.drop_column('long_short_url', 'is_public')
@@ -0,0 +1,28 @@
+"""url_info pagination index
+
+Revision ID: 4c8e1f0a9b27
+Revises: d0d40367ddd5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '4c8e1f0a9b27'
+down_revision: Union[str, None] = 'd0d40367ddd5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_url_info_short_url_action_time',
+        'url_info',
+        ['short_url', 'action_time', 'action_id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_url_info_short_url_action_time', table_name='url_info')
@@ -0,0 +1,114 @@
+"""url_info keyed by link id
+
+Revision ID: 7a2d9e4b6c18
+Revises: 3f61c8a2d5e4
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '7a2d9e4b6c18'
+down_revision: Union[str, None] = '3f61c8a2d5e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Переходы без url_id не попали в счетчики и агрегаты,
+    # которые строились по url_id, поэтому до привязки
+    # к ссылкам они добавляются к уже посчитанным значениям.
+    # Агрегаты не удаляются по сроку хранения, поэтому
+    # пересчет с нуля по url_info потерял бы старые переходы.
+    op.execute(
+        """
+        INSERT INTO link_counter (url_id, clicks, updated_at)
+        SELECT l.id, count(*), max(i.action_time)
+        FROM url_info AS i
+        JOIN long_short_url AS l ON l.short_url = i.short_url
+        WHERE i.url_id IS NULL
+        GROUP BY l.id
+        ON CONFLICT (url_id) DO UPDATE
+        SET clicks = link_counter.clicks + excluded.clicks,
+            updated_at = greatest(
+                link_counter.updated_at, excluded.updated_at
+            )
+        """
+    )
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute(
+            f"""
+            INSERT INTO click_rollup
+            (url_id, granularity, bucket_start, link_type, clicks)
+            SELECT l.id, '{granularity}',
+                date_trunc('{granularity}', i.action_time),
+                i.link_type, count(*)
+            FROM url_info AS i
+            JOIN long_short_url AS l ON l.short_url = i.short_url
+            WHERE i.url_id IS NULL AND i.action_time IS NOT NULL
+            GROUP BY 1, 3, 4
+            ON CONFLICT (url_id, granularity, bucket_start, link_type)
+            DO UPDATE SET clicks = click_rollup.clicks + excluded.clicks
+            """
+        )
+    op.execute(
+        """
+        UPDATE url_info
+        SET url_id = l.id
+        FROM long_short_url AS l
+        WHERE url_info.url_id IS NULL AND l.short_url = url_info.short_url
+        """
+    )
+    # Переходы по ссылкам, которых больше нет в long_short_url,
+    # не к чему привязать, поэтому они удаляются.
+    op.execute(
+        """
+        DELETE FROM url_info
+        WHERE NOT EXISTS (
+            SELECT 1 FROM long_short_url AS l WHERE l.id = url_info.url_id
+        )
+        """
+    )
+    op.alter_column('url_info', 'url_id', nullable=False)
+    op.create_foreign_key(
+        'url_info_url_id_fkey',
+        'url_info',
+        'long_short_url',
+        ['url_id'],
+        ['id'],
+        ondelete='CASCADE'
+    )
+    op.create_index(
+        'ix_url_info_url_id_action_time',
+        'url_info',
+        ['url_id', 'action_time', 'action_id'],
+    )
+    op.drop_index('ix_url_info_short_url_action_time', table_name='url_info')
+    op.drop_column('url_info', 'short_url')
+    op.drop_column('url_info', 'orig_url')
+
+
+def downgrade() -> None:
+    op.add_column('url_info', sa.Column('short_url', sa.String(100)))
+    op.add_column('url_info', sa.Column('orig_url', sa.String(200)))
+    op.execute(
+        """
+        UPDATE url_info
+        SET short_url = l.short_url, orig_url = l.url
+        FROM long_short_url AS l
+        WHERE l.id = url_info.url_id
+        """
+    )
+    op.alter_column('url_info', 'short_url', nullable=False)
+    op.alter_column('url_info', 'orig_url', nullable=False)
+    op.create_index(
+        'ix_url_info_short_url_action_time',
+        'url_info',
+        ['short_url', 'action_time', 'action_id'],
+    )
+    op.drop_index('ix_url_info_url_id_action_time', table_name='url_info')
+    op.drop_constraint('url_info_url_id_fkey', 'url_info', type_='foreignkey')
+    op.alter_column('url_info', 'url_id', nullable=True)
@@ -0,0 +1,68 @@
+"""hashed passwords
+
+Revision ID: 8e5b1d4f7a93
+Revises: c4f7b2e81d06
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import hashlib
+import os
+from base64 import b64encode
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '8e5b1d4f7a93'
+down_revision: Union[str, None] = 'c4f7b2e81d06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 16384, 8, 1
+
+
+def hash_password(password: str) -> str:
+    # Формат совпадает с services.passwords.hash_password.
+    salt = os.urandom(16)
+    key = hashlib.scrypt(
+        password.encode(), salt=salt,
+        n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32,
+        maxmem=256 * SCRYPT_N * SCRYPT_R,
+    )
+    return '$'.join([
+        'scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        b64encode(salt).decode(), b64encode(key).decode(),
+    ])
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'user_password',
+        'password',
+        new_column_name='password_hash',
+        type_=sa.String(200),
+    )
+    bind = op.get_bind()
+    users = bind.execute(
+        sa.text('SELECT id, password_hash FROM user_password')
+    ).all()
+    for user_id, password in users:
+        bind.execute(
+            sa.text(
+                'UPDATE user_password SET password_hash = :password_hash '
+                'WHERE id = :id'
+            ),
+            {'password_hash': hash_password(password), 'id': user_id}
+        )
+
+
+def downgrade() -> None:
+    # Пароли нельзя восстановить по хешам, поэтому колонка
+    # сохраняет хеши и ширину, а вход после отката невозможен
+    # до смены паролей.
+    op.alter_column(
+        'user_password',
+        'password_hash',
+        new_column_name='password',
+    )
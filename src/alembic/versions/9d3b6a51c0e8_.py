@@ -0,0 +1,47 @@
+"""link click counters
+
+Revision ID: 9d3b6a51c0e8
+Revises: 4c8e1f0a9b27
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9d3b6a51c0e8'
+down_revision: Union[str, None] = '4c8e1f0a9b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'link_counter',
+        sa.Column(
+            'url_id',
+            sa.Integer,
+            sa.ForeignKey('long_short_url.id', ondelete='CASCADE'),
+            primary_key=True
+        ),
+        sa.Column(
+            'clicks',
+            sa.BigInteger,
+            nullable=False
+        ),
+        sa.Column(
+            'updated_at',
+            sa.DateTime
+        ),
+    )
+    op.execute(
+        'INSERT INTO link_counter (url_id, clicks, updated_at) '
+        'SELECT i.url_id, count(*), max(i.action_time) FROM url_info i '
+        'JOIN long_short_url l ON l.id = i.url_id GROUP BY i.url_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('link_counter')
@@ -0,0 +1,64 @@
+"""click rollups
+
+Revision ID: b71e2c9f4a30
+Revises: 9d3b6a51c0e8
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b71e2c9f4a30'
+down_revision: Union[str, None] = '9d3b6a51c0e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'click_rollup',
+        sa.Column(
+            'url_id',
+            sa.Integer,
+            sa.ForeignKey('long_short_url.id', ondelete='CASCADE'),
+            primary_key=True
+        ),
+        sa.Column(
+            'granularity',
+            sa.String(10),
+            primary_key=True
+        ),
+        sa.Column(
+            'bucket_start',
+            sa.DateTime,
+            primary_key=True
+        ),
+        sa.Column(
+            'link_type',
+            sa.String(10),
+            primary_key=True
+        ),
+        sa.Column(
+            'clicks',
+            sa.BigInteger,
+            nullable=False
+        ),
+    )
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute(
+            'INSERT INTO click_rollup '
+            '(url_id, granularity, bucket_start, link_type, clicks) '
+            f"SELECT i.url_id, '{granularity}', "
+            f"date_trunc('{granularity}', i.action_time), "
+            'i.link_type, count(*) FROM url_info i '
+            'JOIN long_short_url l ON l.id = i.url_id '
+            'WHERE i.action_time IS NOT NULL '
+            'GROUP BY 1, 3, 4'
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('click_rollup')
@@ -0,0 +1,126 @@
+"""partitioned url_info
+
+Revision ID: c4f7b2e81d06
+Revises: 7a2d9e4b6c18
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c4f7b2e81d06'
+down_revision: Union[str, None] = '7a2d9e4b6c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.month - 1 + months, 12)
+    return moment.replace(year=moment.year + year, month=month + 1)
+
+
+def create_indexes() -> None:
+    op.create_foreign_key(
+        'url_info_url_id_fkey',
+        'url_info',
+        'long_short_url',
+        ['url_id'],
+        ['id'],
+        ondelete='CASCADE'
+    )
+    op.create_index('ix_url_info_action_time', 'url_info', ['action_time'])
+    op.create_index(
+        'ix_url_info_url_id_action_time',
+        'url_info',
+        ['url_id', 'action_time', 'action_id'],
+    )
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE url_info_partitioned (
+            action_id integer NOT NULL
+                DEFAULT nextval('url_info_action_id_seq'::regclass),
+            url_id integer NOT NULL,
+            link_type varchar(10) NOT NULL,
+            action_time timestamp NOT NULL
+        ) PARTITION BY RANGE (action_time)
+        """
+    )
+    op.execute(
+        'CREATE TABLE url_info_default '
+        'PARTITION OF url_info_partitioned DEFAULT'
+    )
+
+    # Месячные секции создаются от самого раннего перехода
+    # до следующего месяца, дальше их создает services.partitions.
+    first_action_time = op.get_bind().execute(
+        sa.text('SELECT min(action_time) FROM url_info')
+    ).scalar()
+    current_month = datetime.utcnow().replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0)
+    start = current_month
+    if first_action_time is not None:
+        start = min(start, first_action_time.replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0))
+    while start <= add_months(current_month, 1):
+        end = add_months(start, 1)
+        op.execute(
+            f'CREATE TABLE url_info_p{start:%Y%m} '
+            'PARTITION OF url_info_partitioned '
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+        start = end
+
+    op.execute(
+        """
+        INSERT INTO url_info_partitioned
+        SELECT i.action_id, i.url_id, i.link_type,
+               coalesce(i.action_time, l.created_at, now())
+        FROM url_info AS i
+        JOIN long_short_url AS l ON l.id = i.url_id
+        """
+    )
+    op.execute(
+        'ALTER SEQUENCE url_info_action_id_seq '
+        'OWNED BY url_info_partitioned.action_id'
+    )
+    op.drop_table('url_info')
+    op.rename_table('url_info_partitioned', 'url_info')
+    op.create_primary_key(
+        'url_info_pkey', 'url_info', ['action_id', 'action_time']
+    )
+    create_indexes()
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE url_info_plain (
+            action_id integer NOT NULL
+                DEFAULT nextval('url_info_action_id_seq'::regclass),
+            url_id integer NOT NULL,
+            link_type varchar(10) NOT NULL,
+            action_time timestamp
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO url_info_plain
+        SELECT action_id, url_id, link_type, action_time FROM url_info
+        """
+    )
+    op.execute(
+        'ALTER SEQUENCE url_info_action_id_seq '
+        'OWNED BY url_info_plain.action_id'
+    )
+    op.drop_table('url_info')
+    op.rename_table('url_info_plain', 'url_info')
+    op.create_primary_key('url_info_pkey', 'url_info', ['action_id'])
+    create_indexes()
@@ -0,0 +1,37 @@
+"""short code id blocks
+
+Revision ID: e5a0d7c3b912
+Revises: b71e2c9f4a30
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e5a0d7c3b912'
+down_revision: Union[str, None] = 'b71e2c9f4a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'code_block',
+        sa.Column(
+            'name',
+            sa.String(50),
+            primary_key=True
+        ),
+        sa.Column(
+            'next_value',
+            sa.BigInteger,
+            nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('code_block')
@@ -5,41 +5,48 @@
 Привязаны к объекту admin_router.
 """
 
-from typing import Optional, Any
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.sql.expression import exists
 
-from models.models import (
-    UrlVisibility,
-    LongShortUrl,
-    UrlInfo,
-    UserPassword
-)
+from models.models import LongShortUrl
 from schemas.response_models import JsonEntity
-from db.db import get_session
-from services.logic import get_cnt_action_with_link
+from db.db import get_session, get_read_session, get_pool_status
+from services.logic import get_cnt_action_with_link, get_url_info_page
+from services.metrics import CONTENT_TYPE, render_metrics
+from services.rollups import ROLLUP_GRANULARITIES, get_click_rollups
+from services.stats import table_stats
 from core.config import (
     PROJECT_HOST as HOST,
     PROJECT_PORT as PORT,
     PAGINATOR_OFFSET,
     PAGINATOR_LIMIT,
+    MAX_PAGE_SIZE,
     logger,
+    status_logger,
 )
 
 admin_router = APIRouter()
 
 
-async def paginator_response():
+async def paginator_response(
+        offset: int = Query(PAGINATOR_OFFSET, ge=0),
+        limit: int = Query(PAGINATOR_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+):
     """
     Корунтина для использования в качестве DI,
     задающая пагинацию возвращаемых данных.
+    Отрицательные значения и limit больше MAX_PAGE_SIZE
+    отклоняются с кодом 422.
     """
     return {
-        "offset": PAGINATOR_OFFSET,
-        "limit": PAGINATOR_LIMIT
+        "offset": offset,
+        "limit": limit
     }
 
 
@@ -49,34 +56,62 @@ async def ping_db(
 ) -> JsonEntity:
     """
     Корутина для проверки доступности базы данных.
-    Опрашивает существующую таблицы, собирает
-    информацию о количестве доступных записей.
+    Выполняет SELECT 1 и не зависит от размера таблиц,
+    поэтому подходит для liveness-проверок.
     В случае ошибки заполняется поле db_status
     значением inactive.
     """
-    result = dict()
-    result['db_status'] = 'active'
-    status_code = 200
-    for model in [LongShortUrl, UserPassword, UrlVisibility, UrlInfo]:
-        try:
-            check_long_short_url_query = select(model)
-            check_long_short_url_query_result = (
-                await session.execute(check_long_short_url_query)).all()
-            records_cnt = len(check_long_short_url_query_result)
-            result[model.__tablename__] = f'{records_cnt} records'
+    try:
+        await session.execute(text('SELECT 1'))
+        return JsonEntity(body={'db_status': 'active'})
+    except Exception as e:
+        logger.error(f'CONNECT ERROR TO DB: {e}')
+        return JsonEntity(body={'db_status': 'inactive'}, status_code=503)
+
+
+@admin_router.get('/ping/stats', response_model=JsonEntity)
+async def get_db_stats(
+        session: AsyncSession = Depends(get_read_session)
+) -> JsonEntity:
+    """
+    Корутина для получения количества записей в таблицах.
+    Использует оценки планировщика PostgreSQL и кэширует
+    результат на STATS_REFRESH_INTERVAL секунд.
+    """
+    try:
+        stats = await table_stats.get(session)
+        return JsonEntity(body={'db_status': 'active', **stats})
+    except Exception as e:
+        logger.error(f'CONNECT ERROR TO DB: {e}')
+        return JsonEntity(body={'db_status': 'inactive'}, status_code=503)
+
+
+@admin_router.get('/db/pool', response_model=JsonEntity)
+async def get_db_pool_status() -> JsonEntity:
+    """
+    Корутина для получения состояния пула соединений:
+    режима, количества выданных соединений,
+    времени ожидания соединения и состояния реплики
+    для запросов только на чтение.
+    """
+    return JsonEntity(body=get_pool_status())
 
-        except Exception as e:
-            logger.error(f'CONNECT ERROR TO DB: {e}')
-            result[model.__tablename__] = 'connection error'
-            result['db_status'] = 'inactive'
-            status_code = 503
 
-    return JsonEntity(body=result, status_code=status_code)
+@admin_router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Корутина для получения метрик процесса
+    в текстовом формате Prometheus: гистограмм
+    времени запросов и запросов к базе данных
+    по маршрутам, ожидания соединений пула,
+    доли попаданий в кэши и длины очереди переходов.
+    """
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
 
 
 @admin_router.get('/user/status', response_model=list[JsonEntity])
 async def get_links_status(
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         params: dict = Depends(paginator_response),
 ) -> list[JsonEntity]:
     """
@@ -85,23 +120,22 @@ async def get_links_status(
     short-id, short-url, original-url, type
     в соответствие с содержимым БД.
     """
-    create_response_query = (select(
-        LongShortUrl,
-        UrlVisibility).filter(LongShortUrl.url == UrlVisibility.url))
-    offset = params['offset']
-    limit = params['limit']
+    create_response_query = (
+        select(LongShortUrl).
+        order_by(LongShortUrl.id).
+        offset(params['offset']).
+        limit(params['limit'])
+    )
     create_response_query_result = (
-        await session.execute(create_response_query)).all()
+        await session.execute(create_response_query)).scalars().all()
     response = []
-    last_record_ind = min(limit + offset, len(create_response_query_result))
 
-    for i in range(offset, last_record_ind):
-        row = create_response_query_result[i]
+    for link in create_response_query_result:
         record = dict()
-        record['short-id'] = row[0].id
-        record['short-url'] = f'http://{HOST}:{PORT}/{row[0].short_url}'
-        record['original-url'] = row[0].url
-        if 'all' in row[1].users:
+        record['short-id'] = link.id
+        record['short-url'] = f'http://{HOST}:{PORT}/{link.short_url}'
+        record['original-url'] = link.url
+        if link.is_public:
             record['type'] = 'public'
         else:
             record['type'] = 'private'
@@ -111,32 +145,40 @@ async def get_links_status(
     return response
 
 
-@admin_router.get('/{short_url}/status', response_model=JsonEntity | list[Any])
+@admin_router.get(
+    '/{short_url}/status',
+    response_model=JsonEntity | list[JsonEntity]
+)
 async def get_short_url_statistics(
         short_url: str,
+        response: Response,
         full_info: Optional[bool] = False,
-        limit: Optional[int] = PAGINATOR_LIMIT,
-        offset: Optional[int] = PAGINATOR_OFFSET,
-        session: AsyncSession = Depends(get_session)
-) -> JsonEntity | list[Any]:
+        limit: int = Query(PAGINATOR_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+        offset: int = Query(PAGINATOR_OFFSET, ge=0),
+        cursor: Optional[str] = None,
+        from_time: Optional[datetime] = Query(None, alias='from'),
+        to_time: Optional[datetime] = Query(None, alias='to'),
+        granularity: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session)
+) -> JsonEntity | list[JsonEntity]:
     """
     Корутина для получения статистики переходов.
     При использовании без параметров возвращает количество
     переходов по указанной ссылке.
     Если параметры указаны, список со всеми взаимодейтсвиями
-    с указанной ссылкой.
+    с указанной ссылкой, от новых к старым.
+    Курсор следующей страницы передается в заголовке
+    X-Next-Cursor, его можно указать в параметре cursor
+    вместо offset. Параметры from и to ограничивают
+    список интервалом времени.
     Пример: bmywdm/status?full_info=True&limit=10&offset=1
+    С параметром granularity (minute, hour, day) возвращает
+    количество переходов по интервалам времени
+    в диапазоне [from, to) из заранее посчитанных агрегатов.
+    Пример: bmywdm/status?granularity=hour&from=2023-10-01T00:00:00
     """
-    check_url_query = (
-        select(UrlInfo).where(
-            UrlInfo.short_url == short_url
-        )
-    )
-
-    is_url_exist = (
-        await session.execute(exists(check_url_query).select())
-    ).all()[0][0]
-    if not is_url_exist:
+    action_cnt = await get_cnt_action_with_link(short_url, session)
+    if action_cnt is None:
         return JsonEntity(
             body={
                 'url': short_url,
@@ -145,23 +187,72 @@ async def get_short_url_statistics(
             status_code=404
         )
 
+    if granularity:
+        status_logger.info('rollups: %s', short_url)
+        if granularity not in ROLLUP_GRANULARITIES:
+            return JsonEntity(
+                body={
+                    'granularity': granularity,
+                    'error': 'Expected one of: '
+                    + ', '.join(ROLLUP_GRANULARITIES),
+                },
+                status_code=400
+            )
+        rollups = await get_click_rollups(
+            short_url=short_url,
+            session=session,
+            granularity=granularity,
+            from_time=from_time,
+            to_time=to_time,
+        )
+        return [
+            JsonEntity(
+                body={
+                    'bucket': rollup.bucket_start.isoformat(),
+                    'type': rollup.link_type,
+                    'count of transitions': rollup.clicks,
+                }
+            )
+            for rollup in rollups
+        ]
+
     if full_info:
-        get_info_query = select(UrlInfo)
-        get_info_query_result = (await session.execute(get_info_query)).all()
-        logger.info('full info')
-        if not offset:
-            offset = PAGINATOR_OFFSET
-        if not limit:
-            limit = PAGINATOR_LIMIT
-
-        last_record_ind = min(limit + offset, len(get_info_query_result))
-        records_to_show = [
-            get_info_query_result[i] for i in range(offset, last_record_ind)
+        status_logger.info('full info: %s', short_url)
+        try:
+            records, next_cursor = await get_url_info_page(
+                short_url=short_url,
+                session=session,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                from_time=from_time,
+                to_time=to_time,
+            )
+        except ValueError:
+            return JsonEntity(
+                body={
+                    'cursor': cursor,
+                    'error': 'Invalid cursor',
+                },
+                status_code=400
+            )
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+
+        return [
+            JsonEntity(
+                body={
+                    'action-id': record.action_id,
+                    'short-url': record.short_url,
+                    'original-url': record.url,
+                    'type': record.link_type,
+                    'action-time': record.action_time.isoformat(),
+                }
+            )
+            for record in records
         ]
-        return records_to_show
     else:
-        logger.info('action cnt')
-        action_cnt = await get_cnt_action_with_link(short_url, session)
+        status_logger.info('action cnt: %s', short_url)
         return JsonEntity(
             body={
                 'url': f'{HOST}:{PORT}/{short_url}',
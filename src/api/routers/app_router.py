@@ -4,39 +4,67 @@
 Привязаны к объекту app_router.
 """
 
-from fastapi import APIRouter, Depends, Body
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Body, Cookie
 from fastapi.responses import (
     ORJSONResponse,
-    FileResponse,
     RedirectResponse,
     HTMLResponse
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core import config
-from core.config import logger
+from core.config import logger, redirect_logger
 from db.db import get_session
+from models.models import LongShortUrl
 from schemas.response_models import JsonEntity
 from services.logic import (
     create_short_url,
-    find_link_to_redirect,
+    create_short_urls_batch,
+    resolve_short_url,
     check_auth,
     check_access,
+    check_link_acl,
     add_info,
     redirect_to_orig_link,
 )
-
-from core.config import PROJECT_HOST as HOST
+from services.templates import template_cache
+from services.tokens import issue_token, read_token
+
+from core.config import (
+    PROJECT_HOST as HOST,
+    SHORTEN_BATCH_LIMIT,
+    SESSION_COOKIE,
+    SESSION_TTL,
+    SESSION_COOKIE_SECURE,
+)
 
 app_router = APIRouter()
 
+URL_MAX_LENGTH = LongShortUrl.url.type.length
+
+
+def set_session_cookie(response: ORJSONResponse, username: str) -> None:
+    """
+    Функция, выдающая пользователю токен сессии в cookie.
+    """
+    response.set_cookie(
+        SESSION_COOKIE,
+        issue_token(username),
+        max_age=SESSION_TTL,
+        httponly=True,
+        secure=SESSION_COOKIE_SECURE,
+        samesite='lax',
+    )
+
 
 @app_router.get('/')
-async def get_user_data() -> FileResponse:
+async def get_user_data() -> HTMLResponse:
     """
     Корутина для перенаправления на форму аутентификации.
     """
-    return FileResponse('templates/auth_form.html')
+    return HTMLResponse(template_cache.render('auth_form.html'))
 
 
 @app_router.post('/auth', response_model=JsonEntity)
@@ -48,20 +76,23 @@ async def check_auth_data_to_log_in(
     Корутина для проверки логина и пароля, получаемых
     из формы в templates/auth_form.html.
     В случае успешной авторизации пользователю становится
-    доступна кнопка для преобразования URL.
+    доступна кнопка для преобразования URL,
+    а в cookie сохраняется токен сессии.
     Вызывается по кнопке Log in.
     """
     username = data['username']
     password = data['password']
-    logger.debug(f'auth {username} -- {password}')
+    logger.debug('auth %s', username)
 
     is_auth_success = await check_auth(username, password, session)
 
     if is_auth_success:
-        return ORJSONResponse(
+        response = ORJSONResponse(
             {'message': f'Welcome, {username}!'},
             status_code=200
         )
+        set_session_cookie(response, username)
+        return response
     else:
         return ORJSONResponse(
             {'message': 'Username or password is incorrect.'},
@@ -92,42 +123,127 @@ async def make_short(
         status_code=201)
 
 
+@app_router.post('/shorten')
+async def make_short_batch(
+        data: list = Body(),
+        session: AsyncSession = Depends(get_session)
+) -> ORJSONResponse:
+    """
+    Корутина для преобразования списка URL.
+    Принимает список словарей с полем original-url,
+    возвращает список с полями short-id и short-url.
+    Созданные ссылки доступны всем пользователям.
+    Пачка отклоняется с кодом 422, если какой-либо адрес
+    не является непустой строкой длиной
+    не больше URL_MAX_LENGTH символов.
+    """
+    if len(data) > SHORTEN_BATCH_LIMIT:
+        return ORJSONResponse(
+            {'message': f'At most {SHORTEN_BATCH_LIMIT} urls per request.'},
+            status_code=413)
+    try:
+        urls = [item['original-url'] for item in data]
+    except (KeyError, TypeError):
+        return ORJSONResponse(
+            {'message': 'Each item must contain original-url.'},
+            status_code=422)
+    for index, url in enumerate(urls):
+        if not isinstance(url, str) or not 0 < len(url) <= URL_MAX_LENGTH:
+            return ORJSONResponse(
+                {
+                    'message': 'original-url must be a non-empty string '
+                               f'of at most {URL_MAX_LENGTH} characters.',
+                    'index': index,
+                },
+                status_code=422)
+
+    links = await create_short_urls_batch(urls, session)
+    return ORJSONResponse(
+        [
+            {
+                'short-id': url_id,
+                'short-url': f'http://{HOST}:{config.PROJECT_PORT}/{short_url}'
+            }
+            for url_id, short_url in links
+        ],
+        status_code=201)
+
+
 @app_router.post('/private_link', response_model=JsonEntity)
 async def check_auth_data(
         data=Body(),
+        session_token: Optional[str] = Cookie(None, alias=SESSION_COOKIE),
         session: AsyncSession = Depends(get_session)
 ) -> ORJSONResponse:
     """
     Корутина для проверки логина и пароля пользователя
     при попытке перейти по приватной ссылке.
+    Пользователь с действующим токеном сессии
+    проходит проверку без пароля.
+    В случае успеха возвращает оригинальный адрес,
+    если пользователь входит в список доступа ссылки.
+    Тело без строкового поля short_url отклоняется
+    с кодом 422.
     """
-    username = data['username']
-    password = data['password']
-
-    is_auth_success = await check_access(username, password, session)
+    short_url = data.get('short_url') if isinstance(data, dict) else None
+    if not isinstance(short_url, str) or not short_url:
+        return ORJSONResponse(
+            {'message': 'Request must contain short_url.'},
+            status_code=422)
 
-    if is_auth_success:
-        return ORJSONResponse({'message': f'Welcome, {username}!'},
-                              status_code=200)
+    link = await resolve_short_url(short_url, session)
+    if link is None:
+        return ORJSONResponse(
+            {'message': 'Link not found.'}, status_code=404)
+
+    username = read_token(session_token)
+    is_new_session = username is None
+    if is_new_session:
+        username = data.get('username', '')
+        password = data.get('password', '')
+        if not isinstance(username, str) or not isinstance(password, str):
+            return ORJSONResponse(
+                {'message': 'Username and password must be strings.'},
+                status_code=422)
+        is_auth_success = await check_access(username, password, session)
+        if not is_auth_success:
+            return ORJSONResponse(
+                {'message': 'Username or password is incorrect.'},
+                status_code=401)
+
+    is_in_acl = await check_link_acl(username, link, session)
+    if is_in_acl:
+        response = ORJSONResponse(
+            {'message': f'Welcome, {username}!', 'url': link.url},
+            status_code=200)
+        if is_new_session:
+            set_session_cookie(response, username)
+        return response
     else:
         return ORJSONResponse(
-            {'message': 'Username or password is incorrect.'}, status_code=401)
+            {'message': 'Access denied.'}, status_code=403)
 
 
 @app_router.get('/{short_url}')
 async def action_handler(
         short_url: str,
+        session_token: Optional[str] = Cookie(None, alias=SESSION_COOKIE),
         session: AsyncSession = Depends(get_session)
 ) -> RedirectResponse | HTMLResponse:
     """
     Корутина, для перехвата коротких ссылок.
     Проверяет существование ссылки и перенаправляет
     на оригинальный адрес.
+    Приватная ссылка открывается сразу, если токен
+    сессии действителен и пользователь входит
+    в список доступа.
     """
-    logger.info(f'~~~ short url: {short_url} ~~~~')
-    try:
-        await add_info(short_url, session)
-    except IndexError:
-        logger.warning('PAGE NOT FOUND')
-    url = await find_link_to_redirect(short_url, session)
-    return (await redirect_to_orig_link(url, session))
+    redirect_logger.info('~~~ short url: %s ~~~~', short_url)
+    link = await resolve_short_url(short_url, session)
+    is_allowed = False
+    if link is not None:
+        add_info(link)
+        username = read_token(session_token)
+        if not link.is_public and username is not None:
+            is_allowed = await check_link_acl(username, link, session)
+    return (await redirect_to_orig_link(short_url, link, is_allowed))
@@ -0,0 +1,195 @@
+"""
+Нагрузочный бенчмарк точек входа сервиса.
+Заполняет базу данных links ссылками и clicks переходами,
+запускает приложение в том же процессе и выполняет
+запросы POST /short, GET /{short_url}, /{short_url}/status
+и /user/status в concurrency параллельных задачах.
+Для каждой точки входа выводит пропускную способность,
+количество ошибок и перцентили задержки в формате JSON.
+Запросы передаются приложению без сетевого сервера,
+поэтому результат не зависит от настроек uvicorn.
+
+Пример запуска из каталога src:
+python -m benchmarks.bench_load --links 1000 --clicks 100000 \\
+    --requests 2000 --concurrency 32 --output load.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta
+
+# Агрегаты трех интервалов занимают до 15 параметров на переход,
+# а asyncpg принимает не больше 32767 параметров в запросе.
+SEED_CHUNK_SIZE = 2000
+CLICKS_PERIOD = timedelta(days=7)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_DSN'))
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('--clicks', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для сохранения результата')
+    return parser.parse_args()
+
+
+async def seed_clicks(
+        session_factory,
+        link_ids: list[int],
+        clicks: int,
+) -> None:
+    """
+    Корутина, записывающая clicks переходов по случайным
+    ссылкам за последние CLICKS_PERIOD вместе со счетчиками
+    и агрегатами, как это делает click_recorder.
+    """
+    from sqlalchemy import insert
+
+    from models import UrlInfo
+    from services.clicks import increment_click_counters
+    from services.rollups import increment_click_rollups
+
+    now = datetime.utcnow()
+    period = int(CLICKS_PERIOD.total_seconds())
+    for start in range(0, clicks, SEED_CHUNK_SIZE):
+        batch = [
+            {
+                'url_id': random.choice(link_ids),
+                'link_type': 'public',
+                'action_time': now - timedelta(
+                    seconds=random.randrange(period)),
+            }
+            for _ in range(min(SEED_CHUNK_SIZE, clicks - start))
+        ]
+        async with session_factory() as session:
+            await session.execute(insert(UrlInfo).values(batch))
+            await increment_click_counters(session, batch)
+            await increment_click_rollups(session, batch)
+            await session.commit()
+
+
+async def delete_links(session_factory, prefix: str) -> None:
+    """
+    Корутина, удаляющая ссылки бенчмарка вместе
+    с переходами, счетчиками и агрегатами.
+    """
+    from sqlalchemy import delete
+
+    from models import LongShortUrl
+
+    async with session_factory() as session:
+        await session.execute(
+            delete(LongShortUrl).
+            where(LongShortUrl.url.startswith(prefix)).
+            execution_options(synchronize_session=False))
+        await session.commit()
+
+
+async def main(args: argparse.Namespace) -> None:
+    import json
+    from itertools import count
+
+    from sqlalchemy.future import select
+
+    from benchmarks.common import (
+        asgi_request,
+        measure_concurrent,
+        summarize,
+        report,
+    )
+    from db.db import engine, async_session
+    from main import app
+    from models import Base, LongShortUrl
+
+    random.seed(args.seed)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Остатки прерванного запуска удаляются до заполнения.
+    prefix = 'http://bench-load/'
+    await delete_links(async_session, prefix)
+    codes = [f'load{i}' for i in range(args.links)]
+    async with async_session() as session:
+        session.add_all(
+            LongShortUrl(url=f'{prefix}{i}', short_url=code)
+            for i, code in enumerate(codes)
+        )
+        await session.commit()
+        link_ids = (await session.execute(
+            select(LongShortUrl.id).
+            where(LongShortUrl.url.startswith(prefix))
+        )).scalars().all()
+    await seed_clicks(async_session, link_ids, args.clicks)
+
+    await app.router.startup()
+
+    new_links = count()
+
+    def short_body() -> bytes:
+        return json.dumps({
+            'url': f'{prefix}new/{next(new_links)}',
+            'creator_name': 'bench',
+            'users': 'all',
+        }).encode()
+
+    scenarios = {
+        'post_short': ('POST', lambda: '/short', short_body),
+        'get_redirect': ('GET', lambda: f'/{random.choice(codes)}', bytes),
+        'get_status': (
+            'GET', lambda: f'/{random.choice(codes)}/status', bytes),
+        'get_user_status': (
+            'GET',
+            lambda: f'/user/status?offset={random.randrange(args.links)}',
+            bytes,
+        ),
+    }
+
+    result = {
+        'dialect': engine.dialect.name,
+        'links': args.links,
+        'clicks': args.clicks,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+    for name, (method, path, body) in scenarios.items():
+        errors = 0
+
+        async def action() -> None:
+            nonlocal errors
+            status = await asgi_request(app, method, path(), body())
+            if status >= 400:
+                errors += 1
+
+        samples, elapsed = await measure_concurrent(
+            action, args.requests, args.concurrency
+        )
+        result[name] = {
+            'requests_per_sec': round(len(samples) / elapsed, 1),
+            'errors': errors,
+            **summarize(samples),
+        }
+
+    # Остановка дожидается записи переходов из очереди,
+    # поэтому удаление ниже захватывает и их.
+    await app.router.shutdown()
+
+    await delete_links(async_session, prefix)
+    await engine.dispose()
+
+    report(result, args.output)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.dsn:
+        os.environ['DATABASE_DSN'] = arguments.dsn
+    asyncio.run(main(arguments))
@@ -0,0 +1,107 @@
+"""
+Бенчмарк проверки паролей.
+Сравнивает вычисление scrypt прямо в event loop
+с вычислением в пуле потоков и с кэшем успешных
+проверок: пропускную способность (входов в секунду)
+и максимальную задержку event loop.
+
+Пример запуска из каталога src:
+python -m benchmarks.bench_login --users 20 --iterations 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_DSN'))
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    from sqlalchemy import delete
+
+    from benchmarks.common import (
+        LoopLagMonitor,
+        measure_concurrent,
+        summarize,
+        report,
+    )
+    from db.db import engine, async_session
+    from models import Base, UserPassword
+    from services.logic import check_access
+    from services.passwords import password_hasher, verify_password
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    prefix = 'bench_login_'
+    users = [(f'{prefix}{i}', f'password{i}') for i in range(args.users)]
+    hashes = await asyncio.gather(
+        *(password_hasher.hash(password) for _, password in users)
+    )
+    async with async_session() as session:
+        session.add_all(
+            UserPassword(username=username, password_hash=password_hash)
+            for (username, _), password_hash in zip(users, hashes)
+        )
+        await session.commit()
+
+    async def inline() -> None:
+        i = random.randrange(args.users)
+        verify_password(users[i][1], hashes[i])
+
+    async def pool() -> None:
+        password_hasher.verified_cache.clear()
+        i = random.randrange(args.users)
+        await password_hasher.verify(users[i][1], hashes[i])
+
+    async def cached() -> None:
+        username, password = random.choice(users)
+        async with async_session() as session:
+            await check_access(username, password, session)
+
+    result = {
+        'users': args.users,
+        'iterations': args.iterations,
+        'concurrency': args.concurrency,
+        'hash_workers': password_hasher.max_workers,
+    }
+    for name, action in (
+            ('kdf_inline', inline),
+            ('kdf_pool', pool),
+            ('check_access_cached', cached),
+    ):
+        async with LoopLagMonitor() as monitor:
+            samples, elapsed = await measure_concurrent(
+                action, args.iterations, args.concurrency
+            )
+        result[name] = {
+            'logins_per_sec': round(len(samples) / elapsed, 1),
+            'max_loop_lag_ms': round(monitor.max_lag * 1000, 3),
+            **summarize(samples),
+        }
+
+    async with async_session() as session:
+        await session.execute(
+            delete(UserPassword).
+            where(UserPassword.username.startswith(prefix)).
+            execution_options(synchronize_session=False))
+        await session.commit()
+    await engine.dispose()
+    password_hasher.shutdown()
+
+    report(result)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.dsn:
+        os.environ['DATABASE_DSN'] = arguments.dsn
+    asyncio.run(main(arguments))
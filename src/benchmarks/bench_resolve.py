@@ -0,0 +1,94 @@
+"""
+Бенчмарк разрешения короткой ссылки.
+Сравнивает прежнюю последовательность запросов
+перенаправления (четыре SELECT) с одним запросом
+и с обращением к кэшу.
+
+Пример запуска из каталога src:
+python -m benchmarks.bench_resolve --links 1000 --iterations 2000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_DSN'))
+    parser.add_argument('--links', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=2000)
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    from sqlalchemy import delete
+    from sqlalchemy.future import select
+
+    from benchmarks.common import measure, summarize, report
+    from db.db import engine, async_session
+    from models import Base, LongShortUrl
+    from services.logic import resolve_short_url, resolve_cache
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    prefix = 'http://bench-resolve/'
+    codes = [f'bench{i}' for i in range(args.links)]
+    async with async_session() as session:
+        session.add_all(
+            LongShortUrl(url=f'{prefix}{i}', short_url=code)
+            for i, code in enumerate(codes)
+        )
+        await session.commit()
+
+    async with async_session() as session:
+
+        async def legacy() -> None:
+            short_url = random.choice(codes)
+            url_id_query = select(LongShortUrl.url, LongShortUrl.id).where(
+                LongShortUrl.short_url == short_url)
+            url = (await session.execute(url_id_query)).all()[0][0]
+            visibility_query = select(LongShortUrl.is_public).where(
+                LongShortUrl.url == url)
+            (await session.execute(visibility_query)).all()
+            url_query = select(LongShortUrl.url).where(
+                LongShortUrl.short_url == short_url)
+            (await session.execute(url_query)).all()
+            (await session.execute(visibility_query)).all()
+
+        async def single() -> None:
+            resolve_cache.clear()
+            await resolve_short_url(random.choice(codes), session)
+
+        async def cached() -> None:
+            await resolve_short_url(random.choice(codes), session)
+
+        result = {
+            'links': args.links,
+            'iterations': args.iterations,
+            'legacy_4_queries': summarize(
+                await measure(legacy, args.iterations)),
+            'single_query': summarize(
+                await measure(single, args.iterations)),
+            'cached': summarize(
+                await measure(cached, args.iterations)),
+        }
+
+    async with async_session() as session:
+        await session.execute(
+            delete(LongShortUrl).
+            where(LongShortUrl.url.startswith(prefix)).
+            execution_options(synchronize_session=False))
+        await session.commit()
+    await engine.dispose()
+
+    report(result)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    if arguments.dsn:
+        os.environ['DATABASE_DSN'] = arguments.dsn
+    asyncio.run(main(arguments))
@@ -0,0 +1,176 @@
+"""
+Модуль с общими функциями бенчмарков:
+замер времени выполнения, задержки event loop,
+расчет перцентилей и запросы к приложению
+без сетевого сервера.
+"""
+
+import asyncio
+import json
+from time import perf_counter
+from typing import Awaitable, Callable, Optional
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """
+    Функция, возвращающая перцентиль q (от 0 до 100)
+    отсортированной выборки методом ближайшего ранга.
+    """
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, round(q / 100 * len(samples)) - 1))
+    return samples[rank]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    Функция, формирующая сводку по задержкам
+    в миллисекундах.
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'count': count,
+        'mean_ms': round(sum(ordered) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if count else 0.0,
+    }
+
+
+async def measure(
+        action: Callable[[], Awaitable],
+        iterations: int
+) -> list[float]:
+    """
+    Корутина, выполняющая action указанное количество
+    раз и возвращающая время каждого выполнения в секундах.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = perf_counter()
+        await action()
+        samples.append(perf_counter() - start)
+    return samples
+
+
+async def measure_concurrent(
+        action: Callable[[], Awaitable],
+        iterations: int,
+        concurrency: int,
+) -> tuple[list[float], float]:
+    """
+    Корутина, выполняющая action указанное количество
+    раз в concurrency параллельных задачах.
+    Возвращает время каждого выполнения и общее время
+    в секундах.
+    """
+    samples: list[float] = []
+    remaining = iter(range(iterations))
+
+    async def worker() -> None:
+        for _ in remaining:
+            start = perf_counter()
+            await action()
+            samples.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, perf_counter() - start
+
+
+class LoopLagMonitor:
+    """
+    Фоновая задача, измеряющая задержку event loop:
+    насколько позже запланированного просыпается
+    sleep(interval).
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+        self._sleep_started = 0.0
+
+    def _update(self) -> None:
+        lag = perf_counter() - self._sleep_started - self.interval
+        self.max_lag = max(self.max_lag, lag)
+
+    async def _run(self) -> None:
+        while True:
+            self._sleep_started = perf_counter()
+            await asyncio.sleep(self.interval)
+            self._update()
+
+    async def __aenter__(self) -> 'LoopLagMonitor':
+        self._task = asyncio.create_task(self._run())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        # Учитывается и sleep, который не успел завершиться,
+        # если event loop был заблокирован до конца замера.
+        self._update()
+        self._task.cancel()
+
+
+async def asgi_request(
+        app: Callable,
+        method: str,
+        path: str,
+        body: bytes = b'',
+) -> int:
+    """
+    Корутина, выполняющая HTTP-запрос к ASGI-приложению
+    в том же процессе и возвращающая код ответа.
+    Сеть не используется, поэтому замер отражает
+    обработку запроса приложением и базой данных.
+    """
+    path, _, query_string = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'benchmark'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('benchmark', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = 0
+
+    async def receive() -> dict:
+        if messages:
+            return messages.pop()
+        # Клиент не отключается, пока ответ не отправлен.
+        await asyncio.Event().wait()
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+def report(result: dict, output: Optional[str] = None) -> None:
+    """
+    Функция, выводящая результат в формате JSON
+    или сохраняющая его в файл output.
+    """
+    if output is None:
+        print(json.dumps(result, indent=2))
+        return
+    with open(output, 'w') as output_file:
+        json.dump(result, output_file, indent=2)
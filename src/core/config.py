@@ -6,22 +6,84 @@ import logging
 from logging import config as logging_config
 from pydantic import BaseSettings
 
-from core.logger import LOGGING
+from core.logger import LOGGING, start_log_listener
 
 logging_config.dictConfig(LOGGING)
+log_listener = start_log_listener()
 logger = logging.getLogger()
+redirect_logger = logging.getLogger('shortener.redirect')
+status_logger = logging.getLogger('shortener.status')
 
 PROJECT_NAME = os.getenv('PROJECT_NAME', 'UrlShorter')
 PROJECT_HOST = os.getenv('PROJECT_HOST', 'localhost')
 PROJECT_PORT = int(os.getenv('PROJECT_PORT', '8080'))
+WORKERS = int(os.getenv('WORKERS', '1'))
+MIGRATION_MODE = os.getenv('MIGRATION_MODE', 'check')
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_RELOAD = os.getenv('TEMPLATES_RELOAD', 'false') == 'true'
 
 CHARACTERS = 'ABCDEFGHJKLMNOPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz234567890'
 SHORT_URL_LENGTH = 6
 
+SHORT_CODE_STRATEGY = os.getenv('SHORT_CODE_STRATEGY', 'random')
+SHORT_CODE_BLOCK_SIZE = int(os.getenv('SHORT_CODE_BLOCK_SIZE', '1000'))
+SEQUENCE_CODE_LENGTH = int(os.getenv('SEQUENCE_CODE_LENGTH', '7'))
+SHORT_CODE_OBFUSCATE = os.getenv('SHORT_CODE_OBFUSCATE', 'true') == 'true'
+SHORTEN_BATCH_LIMIT = int(os.getenv('SHORTEN_BATCH_LIMIT', '1000'))
+SHORTEN_MAX_ATTEMPTS = 10
+
 PAGINATOR_OFFSET = 0
 PAGINATOR_LIMIT = 10
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+
+RESOLVE_CACHE_SIZE = int(os.getenv('RESOLVE_CACHE_SIZE', '10000'))
+RESOLVE_CACHE_TTL = float(os.getenv('RESOLVE_CACHE_TTL', '60'))
+RESOLVE_WARMUP_SIZE = int(os.getenv('RESOLVE_WARMUP_SIZE', '1000'))
+NEGATIVE_CACHE_SIZE = int(os.getenv('NEGATIVE_CACHE_SIZE', '10000'))
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '5'))
+BLOOM_FILTER_ENABLED = os.getenv('BLOOM_FILTER_ENABLED', 'false') == 'true'
+BLOOM_FILTER_CAPACITY = int(os.getenv('BLOOM_FILTER_CAPACITY', '1000000'))
+BLOOM_FILTER_ERROR_RATE = float(os.getenv('BLOOM_FILTER_ERROR_RATE', '0.01'))
+
+REDIS_URL = os.getenv('REDIS_URL', '')
+SHARED_CACHE_TTL = float(os.getenv('SHARED_CACHE_TTL', '300'))
+SHARED_CACHE_PREFIX = os.getenv('SHARED_CACHE_PREFIX', 'shortener:')
+SHARED_CACHE_RECONNECT_DELAY = 1
+
+CLICK_QUEUE_SIZE = int(os.getenv('CLICK_QUEUE_SIZE', '10000'))
+CLICK_BATCH_SIZE = int(os.getenv('CLICK_BATCH_SIZE', '500'))
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '0.5'))
+CLICK_DRAIN_TIMEOUT = float(os.getenv('CLICK_DRAIN_TIMEOUT', '10'))
+CLICK_FLUSH_RETRIES = int(os.getenv('CLICK_FLUSH_RETRIES', '3'))
+CLICK_RETRY_DELAY = float(os.getenv('CLICK_RETRY_DELAY', '0.5'))
+COUNTERS_RECONCILE_INTERVAL = float(
+    os.getenv('COUNTERS_RECONCILE_INTERVAL', '3600')
+)
+
+CLICK_PARTITION_MONTHS_AHEAD = int(
+    os.getenv('CLICK_PARTITION_MONTHS_AHEAD', '3')
+)
+CLICK_RETENTION_DAYS = int(os.getenv('CLICK_RETENTION_DAYS', '0'))
+CLICK_RETENTION_MODE = os.getenv('CLICK_RETENTION_MODE', 'drop')
+
+STATS_REFRESH_INTERVAL = float(os.getenv('STATS_REFRESH_INTERVAL', '60'))
+
+PASSWORD_HASH_WORKERS = int(
+    os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))
+)
+SCRYPT_N = int(os.getenv('SCRYPT_N', '16384'))
+SCRYPT_R = int(os.getenv('SCRYPT_R', '8'))
+SCRYPT_P = int(os.getenv('SCRYPT_P', '1'))
+CREDENTIAL_CACHE_SIZE = int(os.getenv('CREDENTIAL_CACHE_SIZE', '10000'))
+CREDENTIAL_CACHE_TTL = float(os.getenv('CREDENTIAL_CACHE_TTL', '300'))
+
+SESSION_SECRET = os.getenv('SESSION_SECRET', '')
+SESSION_TTL = int(os.getenv('SESSION_TTL', '43200'))
+SESSION_COOKIE = 'session'
+SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'false') == 'true'
+ACL_CACHE_SIZE = int(os.getenv('ACL_CACHE_SIZE', '10000'))
+ACL_CACHE_TTL = float(os.getenv('ACL_CACHE_TTL', '60'))
 
 NO_PAGE_HTML = """
     <html>
@@ -38,6 +100,18 @@ NO_PAGE_HTML = """
 class AppSettings(BaseSettings):
     app_title: str = 'UrlShorter'
     database_dsn: str = ''
+    database_replica_dsn: str = ''
+    db_echo: bool = False
+    db_pool_mode: str = 'queue'
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    db_replica_max_lag: float = 10
+    db_replica_check_interval: float = 5
+    db_replica_check_timeout: float = 2
 
     class Config:
         env_file = '.env'
@@ -1,66 +1,130 @@
 """
 Модуль с описанием параметров логирования.
+Записи ставятся в очередь обработчиком QueueHandler,
+а форматируются и выводятся в отдельном потоке
+QueueListener, поэтому запись в поток вывода
+не блокирует event loop.
+Сообщения форматируются лениво: аргументы записи
+подставляются в сообщение только в потоке вывода.
+Частые события перенаправления и статистики
+записываются с вероятностью, заданной для их логгеров.
 """
 
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_OUTPUT = os.getenv('LOG_OUTPUT', 'json')
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_SAMPLE_RATES = {
+    'shortener.redirect': float(os.getenv('REDIRECT_LOG_SAMPLE_RATE', '0.01')),
+    'shortener.status': float(os.getenv('STATUS_LOG_SAMPLE_RATE', '0.01')),
+    'uvicorn.access': float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '0.01')),
+}
 LOG_DEFAULT_HANDLERS = [
-    'console',
+    'queue',
 ]
 
+log_queue = queue.SimpleQueue()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирование записи в одну строку JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Обработчик, передающий запись в очередь без
+    форматирования. Очередь не покидает процесс,
+    поэтому запись не нужно готовить к сериализации.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Фильтр, пропускающий долю rate записей уровня
+    ниже WARNING. Предупреждения и ошибки
+    пропускаются всегда.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def start_log_listener() -> QueueListener:
+    """
+    Функция, запускающая поток вывода записей из очереди.
+    Поток останавливается при завершении процесса
+    после вывода оставшихся записей.
+    """
+    handler = logging.StreamHandler()
+    if LOG_OUTPUT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+# Конфигурация передается и в uvicorn, поэтому объекты
+# указаны строками: она должна переноситься в процессы-обработчики.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': LOG_FORMAT
-        },
-        'default': {
-            '()': 'uvicorn.logging.DefaultFormatter',
-            'fmt': '%(levelprefix)s %(message)s',
-            'use_colors': None,
-        },
-        'access': {
-            '()':
-            'uvicorn.logging.AccessFormatter',
-            'fmt':
-            "%(levelprefix)s %(client_addr)s - "
-            "'%(request_line)s' %(status_code)s",
-        },
+    'filters': {
+        f'sample_{name}': {
+            '()': 'core.logger.SamplingFilter',
+            'rate': rate,
+        }
+        for name, rate in LOG_SAMPLE_RATES.items()
     },
     'handlers': {
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
-        },
-        'default': {
-            'formatter': 'default',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stdout',
-        },
-        'access': {
-            'formatter': 'access',
-            'class': 'logging.StreamHandler',
-            'stream': 'ext://sys.stdout',
+        'queue': {
+            'class': 'core.logger.LazyQueueHandler',
+            'queue': 'ext://core.logger.log_queue',
         },
     },
     'loggers': {
-        '': {
-            'handlers': LOG_DEFAULT_HANDLERS,
+        'uvicorn': {
             'level': 'INFO',
         },
-        'uvicorn.error': {
-            'level': 'INFO',
-        },
-        'uvicorn.access': {
-            'handlers': ['access'],
-            'level': 'INFO',
-            'propagate': False,
+        **{
+            name: {'filters': [f'sample_{name}']}
+            for name in LOG_SAMPLE_RATES
         },
     },
     'root': {
-        'level': 'INFO',
-        'formatter': 'verbose',
+        'level': LOG_LEVEL,
         'handlers': LOG_DEFAULT_HANDLERS,
     },
 }
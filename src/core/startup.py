@@ -0,0 +1,51 @@
+"""
+Модуль с замером времени запуска процесса по этапам.
+Отсчет начинается при импорте модуля, поэтому
+main.py импортирует его раньше остальных модулей.
+"""
+
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Iterator
+
+
+class StartupTimer:
+    """
+    Длительность этапов запуска в секундах.
+    Этап, уже записанный ранее, не перезаписывается
+    по той же причине, по которой обработчики
+    в services.metrics.instrument_engine не подключаются повторно.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def mark(self, name: str) -> None:
+        """
+        Записывает этап, длившийся от начала отсчета.
+        """
+        self.phases.setdefault(name, perf_counter() - self.started_at)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.setdefault(name, perf_counter() - start)
+
+    def as_dict(self) -> dict[str, float]:
+        """
+        Возвращает длительность этапов и общее время
+        от начала отсчета в миллисекундах.
+        """
+        report = {
+            name: round(seconds * 1000, 1)
+            for name, seconds in self.phases.items()
+        }
+        report['total'] = round((perf_counter() - self.started_at) * 1000, 1)
+        return report
+
+
+startup_timer = StartupTimer()
@@ -1,23 +1,59 @@
 """
 Модуль с подключением к базе данных
-и описанием корутины-фабрики сессий.
+и описанием корутин-фабрик сессий.
+Запросы только на чтение могут выполняться
+на реплике, заданной DATABASE_REPLICA_DSN.
 """
 import os
+from contextlib import AsyncExitStack
 
 from core.config import app_settings
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import Insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.pool import NullPool
+
+from db.pool import InstrumentedQueuePool, InstrumentedNullPool, pool_metrics
+from db.replica import ReplicaRouter, REPLICA_ERRORS
 
 DSN = os.getenv("DATABASE_DSN", default=app_settings.database_dsn)
+REPLICA_DSN = os.getenv(
+    "DATABASE_REPLICA_DSN",
+    default=app_settings.database_replica_dsn
+)
 
 
-engine = create_async_engine(
-    DSN,
-    echo=True,
-    future=True,
-    poolclass=NullPool
-)
+def get_engine_options(dsn: str) -> dict:
+    """
+    Функция, формирующая параметры движка
+    в соответствии с настройками пула из AppSettings.
+    Режим null открывает новое соединение на каждую
+    сессию и используется в тестах.
+    """
+    options = {
+        'echo': app_settings.db_echo,
+        'future': True,
+        'pool_pre_ping': app_settings.db_pool_pre_ping,
+    }
+    if app_settings.db_pool_mode == 'null':
+        options['poolclass'] = InstrumentedNullPool
+    else:
+        options['poolclass'] = InstrumentedQueuePool
+        options['pool_size'] = app_settings.db_pool_size
+        options['max_overflow'] = app_settings.db_max_overflow
+        options['pool_timeout'] = app_settings.db_pool_timeout
+        options['pool_recycle'] = app_settings.db_pool_recycle
+
+    if make_url(dsn).get_driver_name() == 'asyncpg':
+        options['connect_args'] = {
+            'statement_cache_size': app_settings.db_statement_cache_size,
+        }
+    return options
+
+
+engine = create_async_engine(DSN, **get_engine_options(DSN))
 
 async_session = sessionmaker(
     engine,
@@ -26,6 +62,94 @@ async_session = sessionmaker(
 )
 
 
+replica_engine = None
+replica_session = None
+if REPLICA_DSN:
+    replica_options = get_engine_options(REPLICA_DSN)
+    if make_url(REPLICA_DSN).get_driver_name() == 'asyncpg':
+        # Недоступная реплика не должна задерживать запросы
+        # на время стандартного таймаута подключения.
+        replica_options['connect_args']['timeout'] = (
+            app_settings.db_replica_check_timeout
+        )
+    replica_engine = create_async_engine(REPLICA_DSN, **replica_options)
+    replica_session = sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+replica_router = ReplicaRouter(
+    primary_factory=async_session,
+    replica_factory=replica_session,
+    max_lag=app_settings.db_replica_max_lag,
+    check_interval=app_settings.db_replica_check_interval,
+    check_timeout=app_settings.db_replica_check_timeout,
+)
+
+
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def get_read_session() -> AsyncSession:
+    """
+    Корутина-фабрика сессий для запросов только на чтение.
+    Выдает сессию реплики, если она задана и отстает
+    не больше чем на DB_REPLICA_MAX_LAG секунд,
+    иначе сессию основной базы данных.
+    После ошибки соединения с репликой запросы
+    до следующей проверки идут в основную базу данных.
+    """
+    session_factory = await replica_router.get_factory()
+    async with session_factory() as session:
+        try:
+            yield session
+        except REPLICA_ERRORS as e:
+            if session_factory is replica_session:
+                replica_router.mark_unhealthy(e)
+            raise
+
+
+async def warm_up_pool() -> None:
+    """
+    Корутина, заранее открывающая постоянные
+    соединения пула, чтобы первые запросы
+    не ждали установки соединений.
+    """
+    if app_settings.db_pool_mode == 'null':
+        return
+
+    # Соединения удерживаются до выхода из стека,
+    # иначе пул выдавал бы одно и то же соединение.
+    async with AsyncExitStack() as stack:
+        for _ in range(app_settings.db_pool_size):
+            conn = await stack.enter_async_context(engine.connect())
+            await conn.execute(text('SELECT 1'))
+
+
+def dialect_insert(session: AsyncSession, table) -> Insert:
+    """
+    Функция, возвращающая INSERT с поддержкой
+    ON CONFLICT для диалекта, к которому подключена сессия.
+    """
+    if session.bind.dialect.name == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def get_pool_status() -> dict[str, str]:
+    """
+    Функция, возвращающая текущее состояние пула
+    соединений и статистику ожидания соединений.
+    """
+    pool = engine.sync_engine.pool
+    status = {'mode': app_settings.db_pool_mode}
+    if isinstance(pool, InstrumentedQueuePool):
+        status['size'] = str(pool.size())
+        status['checked_out'] = str(pool.checkedout())
+        status['overflow'] = str(pool.overflow())
+    status.update(pool_metrics.as_dict())
+    status.update(replica_router.as_dict())
+    return status
@@ -0,0 +1,67 @@
+"""
+Модуль с проверкой версии схемы базы данных.
+Версия из таблицы alembic_version сравнивается
+с последней ревизией каталога миграций. Ревизии
+определяются по тексту файлов без импорта alembic
+и выполнения сценариев миграций.
+"""
+
+import os
+import re
+from glob import glob
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+REVISION_PATTERN = re.compile(
+    r'^revision(?:\s*:[^=]+)?\s*=\s*[\'"](\w+)[\'"]', re.MULTILINE
+)
+DOWN_REVISION_PATTERN = re.compile(
+    r'^down_revision(?:\s*:[^=]+)?\s*=\s*(.+)$', re.MULTILINE
+)
+REVISION_ID_PATTERN = re.compile(r'[\'"](\w+)[\'"]')
+
+
+def get_script_heads(versions_dir: str) -> set[str]:
+    """
+    Функция, возвращающая ревизии каталога миграций,
+    от которых не зависит ни одна другая ревизия.
+    """
+    revisions = set()
+    parents = set()
+    for path in glob(os.path.join(versions_dir, '*.py')):
+        with open(path, 'r') as script_file:
+            script = script_file.read()
+        revision = REVISION_PATTERN.search(script)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = DOWN_REVISION_PATTERN.search(script)
+        if down_revision is not None:
+            parents.update(REVISION_ID_PATTERN.findall(down_revision.group(1)))
+    return revisions - parents
+
+
+async def get_db_heads(session: AsyncSession) -> set[str]:
+    """
+    Корутина, возвращающая ревизии, примененные
+    к базе данных. Если миграции не применялись,
+    возвращает пустое множество.
+    """
+    try:
+        result = await session.execute(
+            text('SELECT version_num FROM alembic_version')
+        )
+    except ProgrammingError:
+        await session.rollback()
+        return set()
+    return set(result.scalars())
+
+
+async def is_schema_up_to_date(
+        session: AsyncSession,
+        versions_dir: str,
+) -> bool:
+    script_heads = get_script_heads(versions_dir)
+    return bool(script_heads) and await get_db_heads(session) == script_heads
@@ -0,0 +1,66 @@
+"""
+Модуль с пулами соединений, собирающими
+статистику выдачи соединений.
+"""
+
+from time import perf_counter
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+
+class PoolMetrics:
+    """
+    Счетчики выдачи соединений из пула.
+    Время ожидания включает и установку
+    нового соединения, если пул его создает.
+    """
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe(self, wait: float) -> None:
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def as_dict(self) -> dict[str, str]:
+        wait_avg = self.wait_total / self.checkouts if self.checkouts else 0.0
+        return {
+            'checkouts': str(self.checkouts),
+            'timeouts': str(self.timeouts),
+            'wait_total_ms': f'{self.wait_total * 1000:.3f}',
+            'wait_avg_ms': f'{wait_avg * 1000:.3f}',
+            'wait_max_ms': f'{self.wait_max * 1000:.3f}',
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPoolMixin:
+    """
+    Примесь, замеряющая время получения
+    соединения из пула.
+    """
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.observe(perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(InstrumentedPoolMixin, NullPool):
+    pass
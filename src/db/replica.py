@@ -0,0 +1,126 @@
+"""
+Модуль с выбором базы данных для запросов только на чтение.
+Запросы отправляются на реплику, если она задана,
+доступна и отстает от основной базы данных не больше
+допустимого. Иначе используется основная база данных.
+"""
+
+import asyncio
+from time import monotonic
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import logger
+
+# Если реплика получила и применила весь WAL, отставание
+# считается нулевым, даже когда основная база данных
+# давно не выполняла запись.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+# Ошибки, после которых реплика считается недоступной.
+REPLICA_ERRORS = (OSError, OperationalError, InterfaceError)
+
+
+class ReplicaRouter:
+    """
+    Выбор фабрики сессий для запросов только на чтение.
+    Состояние реплики проверяется не чаще одного раза
+    в check_interval секунд; пока идет проверка,
+    остальные запросы используют прежний результат.
+    """
+
+    def __init__(
+            self,
+            primary_factory: Callable[[], AsyncSession],
+            replica_factory: Optional[Callable[[], AsyncSession]],
+            max_lag: float,
+            check_interval: float,
+            check_timeout: float,
+    ) -> None:
+        self.primary_factory = primary_factory
+        self.replica_factory = replica_factory
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.is_healthy = False
+        self.lag: Optional[float] = None
+        self.replica_sessions = 0
+        self.primary_sessions = 0
+        self.errors = 0
+        self._checked_at = float('-inf')
+        self._lock = asyncio.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.replica_factory is None:
+            return 'off'
+        return 'healthy' if self.is_healthy else 'unhealthy'
+
+    async def get_factory(self) -> Callable[[], AsyncSession]:
+        """
+        Корутина, возвращающая фабрику сессий реплики,
+        если реплика исправна, иначе основной базы данных.
+        """
+        if self.replica_factory is None:
+            return self.primary_factory
+        is_check_due = monotonic() - self._checked_at >= self.check_interval
+        if is_check_due and not self._lock.locked():
+            async with self._lock:
+                await self.check()
+        if self.is_healthy:
+            self.replica_sessions += 1
+            return self.replica_factory
+        self.primary_sessions += 1
+        return self.primary_factory
+
+    async def check(self) -> None:
+        """
+        Корутина, измеряющая отставание реплики.
+        Реплика исправна, если ответила за check_timeout
+        секунд и отстает не больше чем на max_lag секунд.
+        """
+        self._checked_at = monotonic()
+        try:
+            async with self.replica_factory() as session:
+                lag = (await asyncio.wait_for(
+                    session.execute(REPLICA_LAG_QUERY),
+                    self.check_timeout,
+                )).scalar()
+        except (*REPLICA_ERRORS, asyncio.TimeoutError) as e:
+            self.mark_unhealthy(e)
+            return
+        self.lag = float(lag or 0)
+        is_healthy = self.lag <= self.max_lag
+        if self.is_healthy and not is_healthy:
+            logger.warning(f'REPLICA LAG {self.lag:.1f}s, USING PRIMARY')
+        self.is_healthy = is_healthy
+
+    def mark_unhealthy(self, error: Exception) -> None:
+        """
+        Переключает запросы на основную базу данных
+        до следующей проверки реплики.
+        """
+        if self.is_healthy or not self.errors:
+            logger.warning(f'REPLICA IS UNAVAILABLE, USING PRIMARY: {error}')
+        self.errors += 1
+        self.is_healthy = False
+        self._checked_at = monotonic()
+
+    def as_dict(self) -> dict[str, str]:
+        return {
+            'replica': self.state,
+            'replica_lag_s': '' if self.lag is None else f'{self.lag:.3f}',
+            'replica_sessions': str(self.replica_sessions),
+            'primary_read_sessions': str(self.primary_sessions),
+        }
@@ -2,21 +2,42 @@
 Модуль с запуском сервиса.
 """
 
-import sys
+from core.startup import startup_timer
+
+import argparse
 import asyncio
+import os
+import secrets
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
-from alembic import command
-from alembic.config import Config
 
 from core import config
-from core.config import app_settings
-from db.db import engine, DSN
+from core.config import app_settings, logger, RESOLVE_WARMUP_SIZE
+from core.logger import LOGGING
+from db.db import (
+    engine,
+    replica_engine,
+    async_session,
+    warm_up_pool,
+    DSN,
+)
+from db.migrations import is_schema_up_to_date
 from models.base import Base
 from api.base_router import router
+from services.bloom import short_code_filter
+from services.clicks import click_recorder
+from services.logic import disable_local_caches, warm_up_resolve_cache
+from services.metrics import MetricsMiddleware, instrument_engine
+from services.partitions import maintain_click_partitions
+from services.passwords import password_hasher
+from services.shared_cache import shared_cache
 
+startup_timer.mark('imports')
+
+MIGRATION_MODES = ('check', 'upgrade', 'off')
+VERSIONS_DIR = os.path.join(config.BASE_DIR, 'alembic', 'versions')
 
 app = FastAPI(
     title=app_settings.app_title,
@@ -26,6 +47,60 @@ app = FastAPI(
 )
 
 app.include_router(router)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine.sync_engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine.sync_engine)
+
+
+@app.on_event('startup')
+async def startup():
+    """
+    Корутина, запускающая фоновые задачи приложения
+    и прогревающая процесс: подключается к общему кэшу,
+    открывает соединения пула,
+    загружает фильтр существующих коротких ссылок
+    и популярные ссылки в кэш.
+    Выполняется в каждом процессе-обработчике
+    и записывает в журнал длительность этапов запуска.
+    """
+    click_recorder.start()
+    with startup_timer.phase('shared_cache'):
+        await shared_cache.start()
+    if shared_cache.url and not shared_cache.enabled:
+        # Без подписки процесс не узнает об изменениях ссылок
+        # на других узлах, поэтому кэши процесса выключаются.
+        logger.error('SHARED CACHE IS UNAVAILABLE, LOCAL CACHES ARE DISABLED')
+        disable_local_caches()
+    try:
+        with startup_timer.phase('pool_warmup'):
+            await warm_up_pool()
+        async with async_session() as session:
+            with startup_timer.phase('bloom_filter'):
+                await short_code_filter.load(session)
+            with startup_timer.phase('resolve_cache'):
+                await warm_up_resolve_cache(session, RESOLVE_WARMUP_SIZE)
+    except Exception as e:
+        logger.error(f'WARM UP ERROR: {e}')
+    startup_timer.mark('ready')
+    logger.info('startup timings, ms: %s', startup_timer.as_dict())
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    """
+    Корутина, дожидающаяся записи накопленных
+    переходов перед остановкой приложения
+    и останавливающая пул хеширования паролей.
+    Вызывается и при получении SIGTERM: uvicorn
+    сначала дожидается обработки текущих запросов.
+    """
+    await click_recorder.stop()
+    await shared_cache.stop()
+    password_hasher.shutdown()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
 
 
 async def reset_database():
@@ -40,20 +115,122 @@ async def reset_database():
 async def apply_migration():
     """
     Корутина для применения миграций с помощью alembic.
+    Alembic импортируется только здесь: процессам-обработчикам
+    и запуску без изменений схемы он не нужен.
+    Настройка журнала из alembic.ini пропускается,
+    чтобы не заменять настройку приложения.
     """
+    from alembic import command
+    from alembic.config import Config
+
     alembic_cfg = Config('alembic.ini')
     alembic_cfg.set_main_option('sqlalchemy.url', DSN)
+    alembic_cfg.attributes['configure_logger'] = False
     loop = asyncio.get_event_loop()
     await loop.run_in_executor(None, command.upgrade, alembic_cfg, 'head')
 
 
-if __name__ == '__main__':
+async def prepare_database(migration: str) -> None:
+    """
+    Корутина, выполняемая один раз до запуска
+    процессов-обработчиков: применяет миграции
+    и создает недостающие секции таблицы переходов.
+    В режиме check миграции применяются, только если
+    версия схемы в alembic_version отличается
+    от последней ревизии каталога миграций,
+    в режиме upgrade - всегда, в режиме off - никогда.
+    """
+    is_up_to_date = False
+    if migration == 'check':
+        with startup_timer.phase('migration_check'):
+            async with async_session() as session:
+                is_up_to_date = await is_schema_up_to_date(
+                    session, VERSIONS_DIR
+                )
+        if is_up_to_date:
+            logger.info('database schema is up to date')
+    if migration != 'off' and not is_up_to_date:
+        with startup_timer.phase('migration_upgrade'):
+            await apply_migration()
+    try:
+        with startup_timer.phase('partitions'):
+            async with async_session() as session:
+                await maintain_click_partitions(session)
+    except Exception as e:
+        logger.error(f'CLICK PARTITIONS MAINTENANCE ERROR: {e}')
+    await engine.dispose()
+    startup_timer.mark('database_ready')
+    logger.info('database timings, ms: %s', startup_timer.as_dict())
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Запуск сервиса.')
+    parser.add_argument(
+        '--migration',
+        choices=MIGRATION_MODES,
+        default=config.MIGRATION_MODE,
+        help='check - применять миграции, только если схема устарела, '
+             'upgrade - применять всегда, off - не применять',
+    )
+    parser.add_argument(
+        '--migration-off',
+        dest='migration',
+        action='store_const',
+        const='off',
+        help='не применять миграции при запуске',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=config.WORKERS,
+        help='количество процессов-обработчиков',
+    )
+    return parser.parse_args()
 
-    if sys.argv[-1] != '--migration-off':
-        asyncio.run(apply_migration())
+
+def prepare_workers_env(workers: int) -> None:
+    """
+    Функция, настраивающая окружение процессов-обработчиков.
+    Процессы запускаются заново и читают настройки
+    из переменных окружения, поэтому общий ключ
+    токенов сессии передается через них.
+    Фильтр Блума без общего кэша не получает ссылки,
+    созданные другими процессами, и выключается.
+    По той же причине выключаются кэши процесса,
+    зависящие от видимости ссылок: иначе после закрытия
+    ссылки в одном процессе другие продолжали бы
+    перенаправлять по ней до истечения времени жизни записи.
+    """
+    if workers <= 1:
+        return
+    if not config.SESSION_SECRET:
+        os.environ['SESSION_SECRET'] = secrets.token_urlsafe(32)
+    if config.REDIS_URL:
+        return
+    if config.BLOOM_FILTER_ENABLED:
+        logger.warning('BLOOM FILTER IS DISABLED FOR MULTIPLE WORKERS')
+        os.environ['BLOOM_FILTER_ENABLED'] = 'false'
+    cache_sizes = {
+        'RESOLVE_CACHE_SIZE': config.RESOLVE_CACHE_SIZE,
+        'NEGATIVE_CACHE_SIZE': config.NEGATIVE_CACHE_SIZE,
+        'ACL_CACHE_SIZE': config.ACL_CACHE_SIZE,
+    }
+    for name, size in cache_sizes.items():
+        if size > 0:
+            logger.warning(f'{name} IS SET TO 0 FOR MULTIPLE WORKERS')
+            os.environ[name] = '0'
+    os.environ['RESOLVE_WARMUP_SIZE'] = '0'
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    asyncio.run(prepare_database(migration=args.migration))
+    prepare_workers_env(args.workers)
 
     uvicorn.run(
         'main:app',
         host=config.PROJECT_HOST,
         port=config.PROJECT_PORT,
+        workers=args.workers,
+        log_config=LOGGING,
     )
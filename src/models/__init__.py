@@ -2,9 +2,20 @@ __all__ = [
     "Base",
     "LongShortUrl",
     "UserPassword",
-    "UrlVisibility",
+    "LinkAcl",
     "UrlInfo",
+    "LinkCounter",
+    "ClickRollup",
+    "CodeBlock",
 ]
 
 from .base import Base
-from .models import LongShortUrl, UserPassword, UrlVisibility, UrlInfo
+from .models import (
+    LongShortUrl,
+    UserPassword,
+    LinkAcl,
+    UrlInfo,
+    LinkCounter,
+    ClickRollup,
+    CodeBlock,
+)
@@ -1,7 +1,19 @@
 """
 Модуль с описанием моделей БД.
 """
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    Boolean,
+    String,
+    DateTime,
+    ForeignKey,
+    Index,
+    DDL,
+    event,
+)
+from sqlalchemy.sql.expression import true
 from datetime import datetime
 
 from .base import Base
@@ -16,6 +28,12 @@ class LongShortUrl(Base):
     url = Column(String(200), unique=True, nullable=False)
     short_url = Column(String(50), unique=True, nullable=False)
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
+    is_public = Column(
+        Boolean,
+        nullable=False,
+        default=True,
+        server_default=true()
+    )
     __mapper_args__ = {"eager_defaults": True}
 
     def __repr__(self):
@@ -29,6 +47,8 @@ class LongShortUrl(Base):
 class UserPassword(Base):
     """
     Модель, хранящая данные о пользователях.
+    Пароль хранится в виде хеша scrypt
+    (см. services.passwords).
     """
     __tablename__ = 'user_password'
     id = Column(Integer, primary_key=True)
@@ -37,50 +57,150 @@ class UserPassword(Base):
         unique=True,
         nullable=False
     )
-    password = Column(String(50), nullable=False)
+    password_hash = Column(String(200), nullable=False)
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
     __mapper_args__ = {"eager_defaults": True}
 
     def __repr__(self):
-        return "UserPassword(id='%s', username='%s', password='%s')" % (
+        return "UserPassword(id='%s', username='%s')" % (
             self.id,
             self.username,
-            self.password,
         )
 
 
-class UrlVisibility(Base):
+class LinkAcl(Base):
     """
-    Модель, хранящая информацию,
-    какие ссылки могут использоваться
-    какими пользователями.
+    Модель, хранящая список пользователей,
+    которым доступна приватная ссылка.
+    Пользователь хранится по имени, так как
+    доступ можно выдать ещё не зарегистрированному
+    пользователю.
     """
-    __tablename__ = 'url_visibility'
-    url = Column(String(200), primary_key=True)
-    users = Column(String(500), nullable=False)
-    __mapper_args__ = {"eager_defaults": True}
+    __tablename__ = 'link_acl'
+    link_id = Column(
+        Integer,
+        ForeignKey('long_short_url.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    username = Column(String(100), primary_key=True, index=True)
 
     def __repr__(self):
-        return "UrlVisibility(url='%s', username='%s')" % (
-            self.url,
-            self.users,
+        return "LinkAcl(link_id='%s', username='%s')" % (
+            self.link_id,
+            self.username,
         )
 
 
 class UrlInfo(Base):
     """
     Модель, хранящая все переходы по ссылкам.
+    Переход ссылается на ссылку по её идентификатору,
+    адреса хранятся только в long_short_url.
+    В PostgreSQL таблица секционирована по месяцам
+    по полю action_time, секциями управляет
+    services.partitions.
     """
     __tablename__ = 'url_info'
-    action_id = Column(Integer, primary_key=True)
-    short_url = Column(String(100), nullable=False)
-    orig_url = Column(String(200), nullable=False)
-    url_id = Column(Integer)
+    action_id = Column(Integer, primary_key=True, autoincrement=True)
+    url_id = Column(
+        Integer,
+        ForeignKey('long_short_url.id', ondelete='CASCADE'),
+        nullable=False
+    )
     link_type = Column(String(10), nullable=False)
-    action_time = Column(DateTime, index=True, default=datetime.utcnow)
+    action_time = Column(
+        DateTime,
+        primary_key=True,
+        index=True,
+        default=datetime.utcnow
+    )
+    __table_args__ = (
+        Index(
+            'ix_url_info_url_id_action_time',
+            'url_id',
+            'action_time',
+            'action_id',
+        ),
+        {'postgresql_partition_by': 'RANGE (action_time)'},
+    )
 
     def __repr__(self):
-        return "UrlInfo(action_id='%s', short_url='%s')" % (
+        return "UrlInfo(action_id='%s', url_id='%s')" % (
             self.action_id,
-            self.short_url,
+            self.url_id,
+        )
+
+
+event.listen(
+    UrlInfo.__table__,
+    'after_create',
+    DDL(
+        'CREATE TABLE IF NOT EXISTS url_info_default '
+        'PARTITION OF url_info DEFAULT'
+    ).execute_if(dialect='postgresql')
+)
+
+
+class LinkCounter(Base):
+    """
+    Модель, хранящая количество переходов по ссылке.
+    Обновляется вместе с записью пачки переходов
+    и периодически сверяется с таблицей url_info.
+    """
+    __tablename__ = 'link_counter'
+    url_id = Column(
+        Integer,
+        ForeignKey('long_short_url.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    clicks = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return "LinkCounter(url_id='%s', clicks='%s')" % (
+            self.url_id,
+            self.clicks,
+        )
+
+
+class ClickRollup(Base):
+    """
+    Модель, хранящая количество переходов по ссылке
+    за интервал времени (минуту, час или день)
+    с разделением по типу ссылки.
+    """
+    __tablename__ = 'click_rollup'
+    url_id = Column(
+        Integer,
+        ForeignKey('long_short_url.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    link_type = Column(String(10), primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return "ClickRollup(url_id='%s', bucket='%s %s', clicks='%s')" % (
+            self.url_id,
+            self.granularity,
+            self.bucket_start,
+            self.clicks,
+        )
+
+
+class CodeBlock(Base):
+    """
+    Модель, хранящая границу последнего
+    зарезервированного блока идентификаторов
+    для генерации коротких ссылок.
+    """
+    __tablename__ = 'code_block'
+    name = Column(String(50), primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return "CodeBlock(name='%s', next_value='%s')" % (
+            self.name,
+            self.next_value,
         )
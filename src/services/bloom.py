@@ -0,0 +1,182 @@
+"""
+Модуль с фильтром Блума существующих коротких ссылок.
+Фильтр строится при запуске приложения и пополняется
+при создании ссылок. Если фильтр не содержит код,
+ссылки точно нет, и запрос к базе данных не нужен.
+Фильтр хранится в памяти процесса, поэтому ссылки,
+созданные другим процессом, попадают в него только
+через сообщения общего кэша (services.shared_cache).
+Если сообщения могли быть потеряны, фильтр загружается
+заново и до окончания загрузки не отклоняет коды.
+Без общего кэша фильтр подходит только для запуска
+в одном процессе.
+"""
+
+import asyncio
+import math
+from hashlib import blake2b
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from core.config import (
+    BLOOM_FILTER_ENABLED,
+    BLOOM_FILTER_CAPACITY,
+    BLOOM_FILTER_ERROR_RATE,
+    logger,
+)
+from models.models import LongShortUrl
+
+LOAD_CHUNK_SIZE = 10000
+
+
+class BloomFilter:
+    """
+    Фильтр Блума с размером, рассчитанным
+    по ожидаемому количеству элементов capacity
+    и доле ложноположительных ответов error_rate.
+    Позиции битов вычисляются двойным хешированием
+    одного дайджеста blake2b.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(1, math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        ))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [
+            (first + i * second) % self.size
+            for i in range(self.hash_count)
+        ]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, other: 'BloomFilter') -> None:
+        """
+        Добавляет все элементы фильтра того же размера.
+        """
+        for i, byte in enumerate(other._bits):
+            self._bits[i] |= byte
+        self.count += other.count
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class ShortCodeFilter:
+    """
+    Фильтр существующих коротких ссылок.
+    Пока фильтр выключен или не загружен,
+    might_exist всегда возвращает True.
+    """
+
+    def __init__(
+            self,
+            enabled: bool,
+            capacity: int,
+            error_rate: float,
+    ) -> None:
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.is_ready = False
+        self.rejected = 0
+        self._filter = BloomFilter(capacity, error_rate)
+        self._generation = 0
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def add(self, short_url: str) -> None:
+        if self.enabled:
+            self._filter.add(short_url)
+
+    def might_exist(self, short_url: str) -> bool:
+        if not self.is_ready or short_url in self._filter:
+            return True
+        self.rejected += 1
+        return False
+
+    async def load(self, session: AsyncSession) -> None:
+        """
+        Корутина, заполняющая фильтр всеми
+        короткими ссылками из базы данных.
+        """
+        if not self.enabled:
+            return
+        self._install(await self._build(session))
+
+    async def _build(self, session: AsyncSession) -> BloomFilter:
+        """
+        Корутина, строящая новый фильтр.
+        Ссылки читаются порциями по LOAD_CHUNK_SIZE.
+        """
+        bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        result = await session.stream_scalars(
+            select(LongShortUrl.short_url).
+            execution_options(yield_per=LOAD_CHUNK_SIZE)
+        )
+        async for short_url in result:
+            bloom_filter.add(short_url)
+        return bloom_filter
+
+    def _install(self, bloom_filter: BloomFilter) -> None:
+        # Ссылки, созданные во время загрузки, уже добавлены
+        # в прежний фильтр, поэтому они переносятся побитовым ИЛИ.
+        bloom_filter.update(self._filter)
+        self._filter = bloom_filter
+        self.is_ready = True
+        logger.info(f'short code filter loaded: {bloom_filter.count} codes')
+
+    def reload(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """
+        Выключает фильтр и запускает его загрузку в фоне.
+        Вызывается, когда сообщения о новых ссылках
+        могли быть потеряны: до окончания загрузки
+        might_exist возвращает True для любого кода.
+        """
+        if not self.enabled:
+            return
+        self.is_ready = False
+        self._generation += 1
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(
+                self._reload(session_factory)
+            )
+
+    async def _reload(
+            self,
+            session_factory: Callable[[], AsyncSession],
+    ) -> None:
+        # Если во время загрузки пришел новый запрос на нее,
+        # прочитанные ссылки могут быть неполными.
+        generation = None
+        while generation != self._generation:
+            generation = self._generation
+            try:
+                async with session_factory() as session:
+                    bloom_filter = await self._build(session)
+            except Exception as e:
+                # Фильтр остается выключенным до следующей загрузки.
+                logger.error(f'SHORT CODE FILTER RELOAD ERROR: {e}')
+                return
+        self._install(bloom_filter)
+
+
+short_code_filter = ShortCodeFilter(
+    enabled=BLOOM_FILTER_ENABLED,
+    capacity=BLOOM_FILTER_CAPACITY,
+    error_rate=BLOOM_FILTER_ERROR_RATE,
+)
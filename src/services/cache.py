@@ -0,0 +1,99 @@
+"""
+Модуль с in-memory кэшем, ограниченным по размеру
+(вытеснение LRU) и по времени жизни записей (TTL).
+"""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Кэш с вытеснением давно не использованных
+    записей и ограничением времени их жизни.
+    Работает в пределах одного процесса
+    и не требует блокировок, так как все обращения
+    происходят из event loop.
+    Каждое удаление записи увеличивает поколение ключа.
+    Значение, прочитанное из базы данных, сохраняется
+    с поколением, полученным до чтения, и отбрасывается,
+    если за время чтения запись была удалена.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Поколения хранятся для последних maxsize удаленных ключей,
+        # для остальных используется поколение последнего
+        # вытесненного ключа: оно не меньше их собственного.
+        self._generations: OrderedDict[Hashable, int] = OrderedDict()
+        self._generation = 0
+        self._generation_floor = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Возвращает значение по ключу либо None,
+        если записи нет или её время жизни истекло.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def generation(self, key: Hashable) -> int:
+        return self._generations.get(key, self._generation_floor)
+
+    def set(
+            self,
+            key: Hashable,
+            value: Any,
+            generation: Optional[int] = None,
+    ) -> None:
+        """
+        Сохраняет значение, вытесняя самую старую
+        запись при превышении размера.
+        Если передано поколение generation и с тех пор
+        запись удалялась, значение не сохраняется.
+        """
+        if self.maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation(key):
+            return
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Удаляет запись из кэша.
+        """
+        self._data.pop(key, None)
+        self._generation += 1
+        self._generations[key] = self._generation
+        self._generations.move_to_end(key)
+        while len(self._generations) > max(self.maxsize, 1):
+            _, self._generation_floor = self._generations.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._generation += 1
+        self._generations.clear()
+        self._generation_floor = self._generation
@@ -0,0 +1,301 @@
+"""
+Модуль с асинхронной записью переходов по ссылкам.
+События складываются в очередь и сохраняются
+фоновой задачей пачками, поэтому перенаправление
+не ждёт записи в базу данных.
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+from time import monotonic
+from typing import Any, Optional
+
+from sqlalchemy import insert, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.expression import func
+
+from core.config import (
+    CLICK_QUEUE_SIZE,
+    CLICK_BATCH_SIZE,
+    CLICK_FLUSH_INTERVAL,
+    CLICK_DRAIN_TIMEOUT,
+    CLICK_FLUSH_RETRIES,
+    CLICK_RETRY_DELAY,
+    COUNTERS_RECONCILE_INTERVAL,
+    logger,
+)
+from db.db import async_session, dialect_insert
+from models.models import UrlInfo, LinkCounter, ClickRollup
+from services.rollups import increment_click_rollups
+
+# Ключ advisory-блокировки пересчета счетчиков переходов.
+COUNTERS_REBUILD_LOCK = 7_007_001
+
+
+async def increment_click_counters(
+        session: AsyncSession,
+        batch: list[dict[str, Any]]
+) -> None:
+    """
+    Корутина, увеличивающая счетчики переходов
+    на количество событий пачки одним upsert-запросом.
+    Строки упорядочены по url_id, чтобы параллельные
+    пачки блокировали счетчики в одном порядке.
+    """
+    clicks_by_url = Counter(event['url_id'] for event in batch)
+    if not clicks_by_url:
+        return
+    now = datetime.utcnow()
+    upsert_query = dialect_insert(session, LinkCounter).values([
+        {'url_id': url_id, 'clicks': clicks, 'updated_at': now}
+        for url_id, clicks in sorted(clicks_by_url.items())
+    ])
+    upsert_query = upsert_query.on_conflict_do_update(
+        index_elements=[LinkCounter.url_id],
+        set_={
+            'clicks': LinkCounter.clicks + upsert_query.excluded.clicks,
+            'updated_at': upsert_query.excluded.updated_at,
+        }
+    )
+    await session.execute(upsert_query)
+
+
+async def rebuild_click_counters(session: AsyncSession) -> bool:
+    """
+    Корутина, пересчитывающая счетчики переходов
+    по дневным агрегатам в одной транзакции.
+    Агрегаты записываются вместе с переходами и,
+    в отличие от url_info, не удаляются по сроку
+    хранения, поэтому счетчики учитывают все переходы.
+    В PostgreSQL пересчет выполняет только процесс,
+    получивший advisory-блокировку: остальные процессы
+    пропускают его и возвращают False.
+    """
+    if session.bind.dialect.name == 'postgresql':
+        is_locked = (await session.execute(
+            text('SELECT pg_try_advisory_xact_lock(:key)'),
+            {'key': COUNTERS_REBUILD_LOCK},
+        )).scalar()
+        if not is_locked:
+            await session.rollback()
+            return False
+    await session.execute(delete(LinkCounter))
+    await session.execute(
+        insert(LinkCounter).from_select(
+            ['url_id', 'clicks', 'updated_at'],
+            select(
+                ClickRollup.url_id,
+                func.sum(ClickRollup.clicks),
+                func.max(ClickRollup.bucket_start),
+            ).
+            where(ClickRollup.granularity == 'day').
+            group_by(ClickRollup.url_id)
+        )
+    )
+    await session.commit()
+    return True
+
+
+class ClickRecorder:
+    """
+    Буфер событий перехода с фоновой записью.
+    Пачка сохраняется одним многострочным INSERT,
+    когда набирается batch_size событий или
+    истекает flush_interval секунд.
+    В той же транзакции обновляются счетчики переходов
+    и агрегаты по интервалам времени,
+    раз в reconcile_interval секунд счетчики пересчитываются
+    по дневным агрегатам.
+    При переполнении очереди новые события
+    отбрасываются и учитываются в счетчике dropped.
+    Пачка, которую не удалось записать, повторяется
+    до retries раз с удваивающейся паузой от retry_delay
+    секунд и только затем учитывается в счетчике failed.
+    """
+
+    def __init__(
+            self,
+            session_factory: sessionmaker,
+            max_queue_size: int,
+            batch_size: int,
+            flush_interval: float,
+            reconcile_interval: float = 0,
+            retries: int = CLICK_FLUSH_RETRIES,
+            retry_delay: float = CLICK_RETRY_DELAY,
+    ) -> None:
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._stop_requested = asyncio.Event()
+        self._reconciled_at = monotonic()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def record(self, event: dict[str, Any]) -> None:
+        """
+        Ставит событие в очередь без ожидания.
+        """
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning('CLICK QUEUE IS FULL, EVENT DROPPED')
+
+    def start(self) -> None:
+        """
+        Запускает фоновую задачу записи.
+        Вызывается при старте приложения.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        # asyncio.Queue привязывается к event loop при первом ожидании,
+        # поэтому при каждом запуске создается новая очередь,
+        # в которую переносятся уже накопленные события.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue.maxsize)
+        while not self._queue.empty():
+            queue.put_nowait(self._queue.get_nowait())
+        self._queue = queue
+        self._stopping = False
+        self._stop_requested = asyncio.Event()
+        self._reconciled_at = monotonic()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = CLICK_DRAIN_TIMEOUT) -> None:
+        """
+        Корутина, дожидающаяся записи всех
+        накопленных событий и останавливающая
+        фоновую задачу.
+        Вызывается при остановке приложения.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._stop_requested.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f'CLICK QUEUE DRAIN TIMEOUT, {self.depth} events lost'
+            )
+        self._task = None
+        logger.info(
+            f'click recorder stopped: flushed={self.flushed} '
+            f'dropped={self.dropped} failed={self.failed} '
+            f'retried={self.retried}'
+        )
+
+    async def _run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._collect_batch()
+            if batch:
+                await self._flush(batch)
+            if self._is_reconcile_due():
+                await self._reconcile()
+
+    def _is_reconcile_due(self) -> bool:
+        return (
+            self.reconcile_interval > 0
+            and not self._stopping
+            and monotonic() - self._reconciled_at >= self.reconcile_interval
+        )
+
+    async def _reconcile(self) -> None:
+        self._reconciled_at = monotonic()
+        try:
+            async with self.session_factory() as session:
+                is_rebuilt = await rebuild_click_counters(session)
+            if is_rebuilt:
+                logger.info('click counters reconciled')
+        except Exception as e:
+            logger.error(f'CLICK COUNTERS RECONCILE ERROR: {e}')
+
+    async def _collect_batch(self) -> list[dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: list[dict[str, Any]] = []
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if self._stopping or timeout <= 0:
+                break
+            event = await self._wait_event(timeout)
+            if event is None:
+                break
+            batch.append(event)
+        return batch
+
+    async def _wait_event(self, timeout: float) -> Optional[dict[str, Any]]:
+        """
+        Корутина, ожидающая событие не дольше timeout секунд.
+        Ожидание прерывается вызовом stop, чтобы остановка
+        не ждала окончания flush_interval.
+        """
+        getter = asyncio.ensure_future(self._queue.get())
+        stopper = asyncio.ensure_future(self._stop_requested.wait())
+        await asyncio.wait(
+            {getter, stopper},
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        stopper.cancel()
+        if getter.done():
+            return getter.result()
+        getter.cancel()
+        return None
+
+    async def _flush(self, batch: list[dict[str, Any]]) -> None:
+        """
+        Корутина, записывающая пачку в одной транзакции.
+        После ошибки транзакция откатывается целиком,
+        поэтому повтор не записывает события дважды.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(insert(UrlInfo).values(batch))
+                    await increment_click_counters(session, batch)
+                    await increment_click_rollups(session, batch)
+                    await session.commit()
+            except Exception as e:
+                if attempt == 0:
+                    logger.error(
+                        f'CLICK BATCH WRITE ERROR, {len(batch)} events: {e}'
+                    )
+                if attempt == self.retries:
+                    self.failed += len(batch)
+                    logger.error(
+                        f'CLICK BATCH LOST AFTER {attempt + 1} attempts, '
+                        f'{len(batch)} events'
+                    )
+                    return
+                self.retried += len(batch)
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+            else:
+                self.flushed += len(batch)
+                return
+
+
+click_recorder = ClickRecorder(
+    session_factory=async_session,
+    max_queue_size=CLICK_QUEUE_SIZE,
+    batch_size=CLICK_BATCH_SIZE,
+    flush_interval=CLICK_FLUSH_INTERVAL,
+    reconcile_interval=COUNTERS_RECONCILE_INTERVAL,
+)
@@ -5,26 +5,111 @@ c обработкой данных и взаимодействием
 с БД.
 """
 
-from random import choices
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+from typing import NamedTuple, Optional
 
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import update
-from sqlalchemy.sql.expression import exists, func
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.expression import exists
 from fastapi.responses import (
     RedirectResponse,
     HTMLResponse
 )
 
 from core.config import (
-    PROJECT_HOST as HOST,
-    PROJECT_PORT as PORT,
-    NO_PAGE_HTML,
     logger,
-    CHARACTERS,
-    SHORT_URL_LENGTH,
+    RESOLVE_CACHE_SIZE,
+    RESOLVE_CACHE_TTL,
+    NEGATIVE_CACHE_SIZE,
+    NEGATIVE_CACHE_TTL,
+    ACL_CACHE_SIZE,
+    ACL_CACHE_TTL,
+    SHORTEN_MAX_ATTEMPTS,
 )
-from models.models import LongShortUrl, UserPassword, UrlVisibility, UrlInfo
+from db.db import async_session, dialect_insert
+from models.models import (
+    LongShortUrl,
+    UserPassword,
+    LinkAcl,
+    UrlInfo,
+    LinkCounter,
+)
+from services.bloom import short_code_filter
+from services.cache import LRUCache
+from services.clicks import click_recorder
+from services.passwords import password_hasher
+from services.shared_cache import shared_cache
+from services.rollups import to_naive_utc
+from services.shortcodes import code_generator
+from services.templates import template_cache, no_page_html
+
+
+class ResolvedLink(NamedTuple):
+    """
+    Результат разрешения короткой ссылки:
+    всё, что нужно для перенаправления
+    и записи информации о переходе.
+    """
+    url_id: int
+    url: str
+    is_public: bool
+
+
+resolve_cache = LRUCache(maxsize=RESOLVE_CACHE_SIZE, ttl=RESOLVE_CACHE_TTL)
+negative_cache = LRUCache(maxsize=NEGATIVE_CACHE_SIZE, ttl=NEGATIVE_CACHE_TTL)
+acl_cache = LRUCache(maxsize=ACL_CACHE_SIZE, ttl=ACL_CACHE_TTL)
+
+
+def register_short_url(short_url: str) -> None:
+    """
+    Функция, сообщающая кэшам о появлении
+    новой короткой ссылки.
+    """
+    negative_cache.invalidate(short_url)
+    short_code_filter.add(short_url)
+
+
+def apply_invalidation(message: dict) -> None:
+    """
+    Функция, удаляющая из кэшей процесса записи,
+    измененные на любом узле. Вызывается для каждого
+    сообщения канала изменений общего кэша.
+    Сообщение reset означает, что изменения могли быть
+    потеряны: кэши очищаются, а фильтр Блума загружается
+    заново, чтобы не отклонять созданные за это время ссылки.
+    """
+    if message.get('reset'):
+        resolve_cache.clear()
+        negative_cache.clear()
+        acl_cache.clear()
+        short_code_filter.reload(async_session)
+        return
+    for short_url in message.get('short_urls', []):
+        resolve_cache.invalidate(short_url)
+        register_short_url(short_url)
+    for username in message.get('usernames', []):
+        acl_cache.invalidate((message['url_id'], username))
+
+
+shared_cache.subscribe(apply_invalidation)
+
+
+def disable_local_caches() -> None:
+    """
+    Функция, выключающая кэши процесса и фильтр Блума.
+    Вызывается, если общий кэш задан, но недоступен:
+    без его сообщений кэши процесса хранили бы
+    устаревшую видимость ссылок и решения о доступе.
+    """
+    for cache in (resolve_cache, negative_cache, acl_cache):
+        cache.maxsize = 0
+        cache.clear()
+    short_code_filter.enabled = False
+    short_code_filter.is_ready = False
 
 
 async def create_short_url(
@@ -36,173 +121,117 @@ async def create_short_url(
     """
     Корутина, возвращающая короткий URL.
     Создает либо берет из базы данных и
-    обрабатывает.
+    обрабатывает видимость в одной транзакции:
+    ссылка записывается запросом
+    INSERT ... ON CONFLICT (url) DO UPDATE ... RETURNING,
+    пользователи добавляются в список доступа
+    INSERT ... ON CONFLICT DO NOTHING.
     """
-    check_existence_query = (
-        select(LongShortUrl.short_url).
-        where(LongShortUrl.url == url)
+    is_public, acl_users = create_visability_acl(
+        creator_name,
+        users_visibility
     )
-    short_url_query_result = (await
-                              session.execute(check_existence_query)).all()
-
-    short_url = await get_or_generate_short_url(
-        url=url,
-        short_url_query_result=short_url_query_result,
-        session=session
+    attempts = 0
+    while True:
+        attempts += 1
+        short_url = await code_generator.generate()
+        try:
+            url_id, short_url = await upsert_short_url(
+                url, short_url, is_public, session
+            )
+            await update_visability(url_id, acl_users, session)
+            await session.commit()
+            break
+        except IntegrityError as e:
+            await session.rollback()
+            if code_generator.is_collision_free or (
+                    attempts >= SHORTEN_MAX_ATTEMPTS):
+                raise
+            logger.warning(f'Try to paste dub of short url: {e}')
+
+    register_short_url(short_url)
+    resolve_cache.invalidate(short_url)
+    await shared_cache.invalidate(
+        {
+            'short_urls': [short_url],
+            'url_id': url_id,
+            'usernames': sorted(acl_users),
+        },
+        keys=[short_url],
     )
-    await handle_visability(url, creator_name, users_visibility, session)
 
     return short_url
 
 
-async def get_or_generate_short_url(
+async def upsert_short_url(
     url: str,
-    short_url_query_result: list[tuple],
+    short_url: str,
+    is_public: Optional[bool],
     session: AsyncSession
-) -> str:
-    """
-    Корутина, которая в зависимости от
-    существования короткой ссылки либо
-    создает новую,
-    либо возвращает существующую из базы
-    данных.
+) -> tuple[int, str]:
     """
-    is_url_exist = short_url_query_result != []
-    if is_url_exist:
-        logger.info('>>>> OLD URL <<<<')
-        short_url = short_url_query_result[0][0]
-    else:
-        logger.info('>>>> NEW URL <<<<')
-        is_generate_success = False
-        while not is_generate_success:
-            short_url = ''.join(choices(CHARACTERS, k=SHORT_URL_LENGTH))
-
-            new_url_entry = LongShortUrl(url=url, short_url=short_url)
-            session.add(new_url_entry)
-            try:
-                await session.commit()
-                is_generate_success = True
-            except Exception as e:
-                is_generate_success = False
-                await session.rollback()
-                logger.warning(f'Try to paste dub of short url: {e}')
-
-    return short_url
-
-
-async def handle_visability(
-        url: str,
-        creator_name: str,
-        users_visibility: str,
-        session: AsyncSession
-) -> None:
+    Корутина, создающая ссылку с коротким URL short_url
+    либо, если адрес уже сокращен, возвращающая
+    существующую ссылку вместе с её идентификатором.
+    Строка существующей ссылки блокируется до конца
+    транзакции, поэтому параллельные запросы
+    к одному адресу обрабатываются по очереди.
+    Признак публичности меняется, если is_public не None.
     """
-    Корутина, обрабатывающая состояние
-    видимости ссылки в зависимости от того,
-    создана ли ссылка только что или
-    уже существует.
-    """
-    url_visability_query = (
-        select(UrlVisibility.users).
-        where(UrlVisibility.url == url)
+    upsert_query = dialect_insert(session, LongShortUrl).values(
+        url=url,
+        short_url=short_url,
+        is_public=True if is_public is None else is_public,
     )
-    url_visability_query_result = (
-        await session.execute(url_visability_query)
-    ).all()
-
-    logger.debug(url_visability_query_result)
-
-    if url_visability_query_result == []:
-        await create_new_visability(
-            creator_name,
-            url,
-            users_visibility,
-            session
-        )
-
-    else:
-        await update_visability(
-            creator_name,
-            url,
-            users_visibility,
-            url_visability_query_result,
-            session
-        )
-
-
-async def create_new_visability(
-        creator_name: str,
-        url: str,
-        users_visibility: str,
-        session: AsyncSession
-) -> None:
-    """
-    Корутина, создающая запись о
-    состоянии видимости ссылки для
-    других пользователей.
-    Вызывается при первоначальном создании
-    короткой ссылки.
-    """
-    logger.debug('NEW VISABILITY')
-    if users_visibility == '':
-        users_visibility = 'all'
+    if is_public is None:
+        # Обновление без изменений нужно, чтобы RETURNING
+        # вернул существующую строку и заблокировал её.
+        set_ = {'url': upsert_query.excluded.url}
     else:
-        users_visibility = f'{creator_name} {users_visibility}'
-
-    logger.debug(users_visibility)
-    new_url_visability = UrlVisibility(url=url, users=users_visibility)
-    session.add(new_url_visability)
-    await session.commit()
+        set_ = {'is_public': upsert_query.excluded.is_public}
+    upsert_query = upsert_query.on_conflict_do_update(
+        index_elements=[LongShortUrl.url],
+        set_=set_,
+    ).returning(LongShortUrl.id, LongShortUrl.short_url)
+    url_id, short_url = (await session.execute(upsert_query)).one()
+    logger.info('>>>> URL %s <<<<', url_id)
+    return url_id, short_url
 
 
 async def update_visability(
-        creator_name: str,
-        url: str,
-        users_visibility: str,
-        url_visability_query_result: list,
+        url_id: int,
+        acl_users: set[str],
         session: AsyncSession
 ) -> None:
     """
-    Корутина, обрабатывающая запрос
-    пользователя на изменения видимости
-    короткой ссылки.
-    Новые права на видимость сохраняются
-    в базе данных.
+    Корутина, добавляющая пользователей
+    в список доступа ссылки.
     """
-    logger.debug('UPDATE VISABILITY')
-    users_visibility = await create_visability_str(
-        creator_name,
-        users_visibility,
-        url_visability_query_result
-    )
-    update_query = (
-        update(UrlVisibility).
-        where(UrlVisibility.url == url).values(
-            {
-                'url': url,
-                'users': users_visibility
-            }
-        )
-    )
-    await session.execute(update_query)
-    await session.commit()
+    insert_acl_query = dialect_insert(session, LinkAcl).values([
+        {'link_id': url_id, 'username': username}
+        for username in sorted(acl_users)
+    ]).on_conflict_do_nothing()
+    await session.execute(insert_acl_query)
+    for username in acl_users:
+        acl_cache.invalidate((url_id, username))
 
 
-async def create_visability_str(
+def create_visability_acl(
         creator_name: str,
         users_visibility: str,
-        url_visability_query_result: list,
-) -> str:
+) -> tuple[Optional[bool], set[str]]:
     """
-    Корутина, формирующая новую строку
-    с именами пользователей, которым доступна
-    короткая ссылка.
+    Функция, формирующая новый признак публичности
+    ссылки и имена пользователей, добавляемых
+    в список доступа.
+    Ссылка становится публичной, если среди имен
+    указано all, и перестает быть публичной,
+    если указаны только конкретные пользователи.
+    Если имена не указаны, признак не меняется (None),
+    а новая ссылка создается публичной.
+    Создатель ссылки всегда имеет к ней доступ.
     """
-    users_set = set(
-        url_visability_query_result[0][0].
-        split(' ')
-    )
-    is_have_all_before = 'all' in users_set
+    users_set = set()
     is_have_all_after = False
     is_have_not_none = False
     for user in users_visibility.split(' '):
@@ -211,33 +240,174 @@ async def create_visability_str(
         if user != '':
             is_have_not_none = True
             users_set.add(user)
+    users_set.discard('all')
     users_set.add(creator_name)
 
-    if is_have_all_before and not is_have_all_after and is_have_not_none:
-        users_set.remove('all')
+    is_public = None
+    if is_have_not_none:
+        is_public = is_have_all_after
 
     logger.debug(users_set)
-    users_visibility = ' '.join(users_set)
-    return users_visibility
+    return is_public, users_set
 
 
-async def find_link_to_redirect(
+async def create_short_urls_batch(
+    urls: list[str],
+    session: AsyncSession
+) -> list[tuple[int, str]]:
+    """
+    Корутина, возвращающая идентификаторы и короткие URL
+    для списка адресов в порядке их передачи.
+    Существующие ссылки находятся одним запросом
+    WHERE url IN (...), новые публичные ссылки записываются
+    многострочным INSERT ... ON CONFLICT DO NOTHING
+    в одной транзакции.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    get_links_query = select(
+        LongShortUrl.url,
+        LongShortUrl.id,
+        LongShortUrl.short_url,
+    ).where(LongShortUrl.url.in_(unique_urls))
+    links = {
+        url: (url_id, short_url)
+        for url, url_id, short_url
+        in (await session.execute(get_links_query)).all()
+    }
+
+    new_urls = [url for url in unique_urls if url not in links]
+    created_urls = new_urls
+    attempts = 0
+    while new_urls:
+        attempts += 1
+        if attempts > SHORTEN_MAX_ATTEMPTS:
+            raise RuntimeError('Could not generate unique short urls')
+        insert_links_query = dialect_insert(session, LongShortUrl).values([
+            {'url': url, 'short_url': await code_generator.generate()}
+            for url in new_urls
+        ]).on_conflict_do_nothing()
+        await session.execute(insert_links_query)
+
+        get_new_links_query = get_links_query.where(
+            LongShortUrl.url.in_(new_urls)
+        )
+        for url, url_id, short_url in (
+            await session.execute(get_new_links_query)
+        ).all():
+            links[url] = (url_id, short_url)
+        # Адреса без записи получили уже занятый случайный код.
+        new_urls = [url for url in new_urls if url not in links]
+
+    await session.commit()
+    for _, short_url in links.values():
+        register_short_url(short_url)
+    await shared_cache.invalidate(
+        {'short_urls': [links[url][1] for url in created_urls]},
+        keys=[],
+    )
+
+    logger.info('>>>> BATCH OF %s URLS <<<<', len(unique_urls))
+    return [links[url] for url in urls]
+
+
+async def resolve_short_url(
     short_url: str, session: AsyncSession
-) -> str:
+) -> Optional[ResolvedLink]:
     """
     Корутина, возвращающая истинный url
-    в соответствии с сокращенным
-    из базы данных.
+    и его видимость в соответствии с сокращенным.
+    Сначала проверяет кэш, при промахе получает
+    ссылку вместе с признаком публичности одним
+    запросом к базе данных и сохраняет результат в кэш.
+    Если включен общий кэш, он проверяется перед
+    запросом к базе данных.
+    Возвращает None, если ссылка не найдена.
+    Коды, отсутствующие в фильтре Блума или
+    в кэше ненайденных ссылок, отклоняются
+    без запроса к базе данных.
     """
-    get_url_query = select(
-        LongShortUrl.url).where(LongShortUrl.short_url == short_url)
+    link = resolve_cache.get(short_url)
+    if link is not None:
+        return link
+    # Поколение запоминается до чтения, чтобы не сохранить
+    # в кэш ссылку, измененную во время чтения.
+    generation = resolve_cache.generation(short_url)
+    negative_generation = negative_cache.generation(short_url)
+    if not short_code_filter.might_exist(short_url):
+        return None
+    if negative_cache.get(short_url) is not None:
+        return None
+    shared_link = await shared_cache.get(short_url)
+    if shared_link is not None:
+        link = ResolvedLink(*shared_link)
+        resolve_cache.set(short_url, link, generation)
+        return link
+
+    get_url_query = (
+        select(
+            LongShortUrl.id,
+            LongShortUrl.url,
+            LongShortUrl.is_public,
+        ).
+        where(LongShortUrl.short_url == short_url)
+    )
     get_url_query_result = (await session.execute(get_url_query)).all()
-    if get_url_query_result != []:
-        url = get_url_query_result[0][0]
-    else:
-        url = f'{HOST}:{PORT}/path_error'
-    logger.debug(f'true url: {url}')
-    return url
+    if get_url_query_result == []:
+        negative_cache.set(short_url, True, negative_generation)
+        return None
+    url_id, url, is_public = get_url_query_result[0]
+
+    link = ResolvedLink(
+        url_id=url_id,
+        url=url,
+        is_public=is_public,
+    )
+    if resolve_cache.generation(short_url) == generation:
+        resolve_cache.set(short_url, link)
+        await shared_cache.set(short_url, list(link))
+    logger.debug('true url: %s', url)
+    return link
+
+
+async def warm_up_resolve_cache(session: AsyncSession, limit: int) -> None:
+    """
+    Корутина, заполняющая кэш коротких ссылок
+    limit ссылками с наибольшим количеством переходов.
+    """
+    if limit <= 0:
+        return
+    get_popular_query = (
+        select(
+            LongShortUrl.short_url,
+            LongShortUrl.id,
+            LongShortUrl.url,
+            LongShortUrl.is_public,
+        ).
+        join(LinkCounter, LinkCounter.url_id == LongShortUrl.id).
+        order_by(LinkCounter.clicks.desc()).
+        limit(limit)
+    )
+    for short_url, url_id, url, is_public in (
+        await session.execute(get_popular_query)
+    ).all():
+        resolve_cache.set(
+            short_url,
+            ResolvedLink(url_id=url_id, url=url, is_public=is_public)
+        )
+    logger.info(f'resolve cache warmed up: {len(resolve_cache)} links')
+
+
+async def get_password_hash(
+    username: str,
+    session: AsyncSession
+) -> Optional[str]:
+    """
+    Корутина, возвращающая хеш пароля пользователя
+    либо None, если пользователь не зарегистрирован.
+    """
+    get_hash_query = select(
+        UserPassword.password_hash).where(UserPassword.username == username)
+    return (await session.execute(get_hash_query)).scalar()
 
 
 async def check_auth(
@@ -248,35 +418,35 @@ async def check_auth(
     Корутинка для проверки данных пользователя.
     При создании аккаунта возможно использовать
     логин только без пробелов.
+    Незарегистрированный пользователь создается
+    с хешем указанного пароля.
     Возвращает True в случае корректных данных.
     """
     if ' ' in username:
         return False
 
-    is_log_in_success = False
-    new_user = UserPassword(username=username, password=password)
-    session.add(new_user)
-    try:
-        is_log_in_success = True
-        await session.commit()
-
-    except Exception:
-        logger.info('USER IS EXIST')
-        await session.rollback()
-
-        check_password_query = select(
-            UserPassword.password).where(UserPassword.username == username)
-        check_password_query_result = (
-            await session.execute(check_password_query)).all()
-
-        logger.info(f'true_password == {check_password_query_result}')
-
-        if password == check_password_query_result[0][0]:
-            logger.info('>>>> LOG IN SUCCESS <<<<')
-            is_log_in_success = True
-        else:
-            logger.info('>>>> LOG IN FAIL <<<<')
-            is_log_in_success = False
+    password_hash = await get_password_hash(username, session)
+    if password_hash is None:
+        new_user = UserPassword(
+            username=username,
+            password_hash=await password_hasher.hash(password)
+        )
+        session.add(new_user)
+        try:
+            await session.commit()
+            logger.info('>>>> NEW USER <<<<')
+            return True
+        except IntegrityError:
+            # Пользователя одновременно создал другой запрос.
+            logger.info('USER IS EXIST')
+            await session.rollback()
+            password_hash = await get_password_hash(username, session)
+
+    is_log_in_success = await password_hasher.verify(password, password_hash)
+    if is_log_in_success:
+        logger.info('>>>> LOG IN SUCCESS <<<<')
+    else:
+        logger.info('>>>> LOG IN FAIL <<<<')
 
     return is_log_in_success
 
@@ -288,95 +458,189 @@ async def check_access(
     """
     Корутина для проверки прав доступа перехода по ссылке.
     """
-    check_user_query = (
-        select(UserPassword).where(
-            UserPassword.username == username,
-            UserPassword.password == password
-        )
-    )
-
-    is_have_access = (
-        await session.execute(exists(check_user_query).select())
-    ).all()[0][0]
+    password_hash = await get_password_hash(username, session)
+    if password_hash is None:
+        return False
 
-    return is_have_access
+    return await password_hasher.verify(password, password_hash)
 
 
-async def add_info(short_url: str, session: AsyncSession) -> None:
+async def check_link_acl(
+    username: str,
+    link: ResolvedLink,
+    session: AsyncSession
+) -> bool:
     """
-    Корутина для добавления информации о взаимодейсвии с ссылкой.
+    Корутина для проверки, что пользователь входит
+    в список доступа ссылки. Публичная ссылка
+    доступна всем пользователям.
+    Результат проверки кэшируется на ACL_CACHE_TTL секунд.
     """
-    get_orig_url_query = select(
-        LongShortUrl.url,
-        LongShortUrl.id,
-    ).where(LongShortUrl.short_url == short_url)
-
-    get_orig_url_query_result = (
-        await session.execute(get_orig_url_query)
-    ).all()
+    if link.is_public:
+        return True
+    is_in_acl = acl_cache.get((link.url_id, username))
+    if is_in_acl is not None:
+        return is_in_acl
+    generation = acl_cache.generation((link.url_id, username))
+
+    check_acl_query = (
+        select(LinkAcl).where(
+            LinkAcl.link_id == link.url_id,
+            LinkAcl.username == username
+        )
+    )
+    is_in_acl = (
+        await session.execute(exists(check_acl_query).select())
+    ).scalar()
+    acl_cache.set((link.url_id, username), is_in_acl, generation)
 
-    orig_url = get_orig_url_query_result[0][0]
-    url_id = get_orig_url_query_result[0][1]
+    return is_in_acl
 
-    get_visability_query = select(
-        UrlVisibility.users).where(UrlVisibility.url == orig_url)
-    get_visability_query_result = (
-        await session.execute(get_visability_query)).all()[0][0]
 
-    if 'all' in get_visability_query_result:
+def add_info(link: ResolvedLink) -> None:
+    """
+    Функция для добавления информации о взаимодейсвии с ссылкой.
+    Событие ставится в очередь и записывается
+    в базу данных фоновой задачей click_recorder.
+    """
+    if link.is_public:
         vis = 'public'
     else:
         vis = 'private'
 
-    new_url_info = UrlInfo(
-        short_url=short_url,
-        orig_url=orig_url,
-        url_id=url_id,
-        link_type=vis
-    )
-
-    session.add(new_url_info)
-    await session.commit()
+    click_recorder.record({
+        'url_id': link.url_id,
+        'link_type': vis,
+        'action_time': datetime.utcnow(),
+    })
 
 
 async def get_cnt_action_with_link(
     short_url: str,
     session: AsyncSession
-) -> int:
+) -> Optional[int]:
     """
-    Корутина для подсчета количества переходов по ссылке.
+    Корутина для получения количества переходов по ссылке
+    из счетчика link_counter.
+    Возвращает None, если переходов по ссылке не было.
     """
-    get_url_info_query = (
-        select(func.count(UrlInfo.short_url)).
-        group_by(UrlInfo.short_url).
-        having(UrlInfo.short_url == short_url)
+    get_counter_query = (
+        select(LinkCounter.clicks).
+        join(LongShortUrl, LongShortUrl.id == LinkCounter.url_id).
+        where(LongShortUrl.short_url == short_url)
     )
-    cnt = (await session.execute(get_url_info_query)).scalar()
+    cnt = (await session.execute(get_counter_query)).scalar()
 
     return cnt
 
 
+def encode_cursor(action_time: datetime, action_id: int) -> str:
+    """
+    Функция, формирующая курсор постраничного
+    вывода по последней показанной записи.
+    """
+    raw = f'{action_time.isoformat()}|{action_id}'
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Функция, восстанавливающая время и номер записи
+    из курсора. Для некорректного курсора
+    выбрасывает ValueError.
+    """
+    raw = urlsafe_b64decode(cursor.encode()).decode()
+    action_time, action_id = raw.split('|')
+    return datetime.fromisoformat(action_time), int(action_id)
+
+
+async def get_url_info_page(
+    short_url: str,
+    session: AsyncSession,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None,
+) -> tuple[list[Row], Optional[str]]:
+    """
+    Корутина, возвращающая страницу переходов по ссылке
+    от новых к старым и курсор следующей страницы.
+    Каждая запись содержит поля перехода, а также
+    short_url и url ссылки.
+    С курсором страница выбирается по ключу
+    (action_time, action_id), и её стоимость не зависит
+    от глубины, иначе используется offset.
+    Границы from_time и to_time ограничивают выборку
+    интервалом [from_time, to_time) и позволяют
+    не читать секции url_info вне интервала.
+    """
+    get_info_query = (
+        select(
+            UrlInfo.action_id,
+            UrlInfo.link_type,
+            UrlInfo.action_time,
+            LongShortUrl.short_url,
+            LongShortUrl.url,
+        ).
+        join(LongShortUrl, LongShortUrl.id == UrlInfo.url_id).
+        where(LongShortUrl.short_url == short_url).
+        order_by(UrlInfo.action_time.desc(), UrlInfo.action_id.desc()).
+        limit(limit)
+    )
+    if from_time is not None:
+        get_info_query = get_info_query.where(
+            UrlInfo.action_time >= to_naive_utc(from_time)
+        )
+    if to_time is not None:
+        get_info_query = get_info_query.where(
+            UrlInfo.action_time < to_naive_utc(to_time)
+        )
+    if cursor:
+        action_time, action_id = decode_cursor(cursor)
+        get_info_query = get_info_query.where(
+            tuple_(UrlInfo.action_time, UrlInfo.action_id)
+            < tuple_(action_time, action_id)
+        )
+    elif offset:
+        get_info_query = get_info_query.offset(offset)
+
+    records = (await session.execute(get_info_query)).all()
+
+    next_cursor = None
+    if len(records) == limit:
+        last_record = records[-1]
+        next_cursor = encode_cursor(
+            last_record.action_time,
+            last_record.action_id
+        )
+    return records, next_cursor
+
+
 async def redirect_to_orig_link(
-        url: str,
-        session: AsyncSession
+        short_url: str,
+        link: Optional[ResolvedLink],
+        is_allowed: bool = False,
 ) -> RedirectResponse | HTMLResponse:
     """
     Корутина, обрабатывающая перенаправление на
     оригинальный адрес.
-    Проверяет существование такого в базе данных,
+    Проверяет, что ссылка найдена,
     а также проверяет тип доступности для пользователей.
+    Для приватной ссылки возвращает форму входа,
+    оригинальный адрес выдается только после
+    проверки списка доступа. Если доступ уже
+    подтвержден токеном сессии (is_allowed),
+    перенаправляет сразу.
     """
-    url_visability_query = (select(
-        UrlVisibility.users).where(UrlVisibility.url == url))
-    try:
-        url_visability_query_result = (
-            await session.execute(url_visability_query)).all()[0][0]
-        if 'all' in url_visability_query_result:
-            return RedirectResponse(url, status_code=307)
-        else:
-            with open('templates/private_link.html', 'r') as html_file:
-                html_content = html_file.read().replace('<PRIVATE_URL>', url)
-            return HTMLResponse(content=html_content, status_code=200)
-    except IndexError:
+    if link is None:
         logger.warning('PAGE NOT FOUND')
-        return HTMLResponse(content=NO_PAGE_HTML, status_code=404)
+        return HTMLResponse(content=no_page_html, status_code=404)
+
+    if link.is_public or is_allowed:
+        return RedirectResponse(link.url, status_code=307)
+    else:
+        html_content = template_cache.render(
+            'private_link.html', SHORT_URL=short_url
+        )
+        return HTMLResponse(content=html_content, status_code=200)
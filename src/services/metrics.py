@@ -0,0 +1,417 @@
+"""
+Модуль с метриками приложения в текстовом формате Prometheus.
+ASGI-посредник MetricsMiddleware замеряет время обработки
+запросов по шаблонам маршрутов, а обработчики событий
+SQLAlchemy считают запросы к базе данных и их время
+в пределах каждого HTTP-запроса.
+Состояние пула соединений, кэшей, очереди переходов
+и длительность этапов запуска собираются в момент
+обращения к /metrics.
+"""
+
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Starlette сама добавляет charset к текстовым типам.
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(
+        f'{name}="{escape_label(str(value))}"'
+        for name, value in zip(names, values)
+    )
+    return f'{{{pairs}}}'
+
+
+def escape_label(value: str) -> str:
+    return (
+        value.replace('\\', '\\\\').
+        replace('"', '\\"').
+        replace('\n', '\\n')
+    )
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Монотонно растущий счетчик с метками.
+    """
+
+    kind = 'counter'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self._values[label_values] = (
+            self._values.get(label_values, 0) + amount
+        )
+
+    def samples(self) -> list[str]:
+        return [
+            f'{self.name}{format_labels(self.labels, label_values)} '
+            f'{format_value(value)}'
+            for label_values, value in sorted(self._values.items())
+        ]
+
+
+class Histogram:
+    """
+    Гистограмма с накопительными корзинами buckets,
+    суммой и количеством наблюдений для каждого
+    набора меток.
+    """
+
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        counts, total = self._values.setdefault(
+            label_values, ([0] * (len(self.buckets) + 1), [0.0])
+        )
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        total[0] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        bucket_labels = self.labels + ('le',)
+        for label_values, (counts, total) in sorted(self._values.items()):
+            bounds = self.buckets + (float('inf'),)
+            for bound, count in zip(bounds, counts):
+                labels = format_labels(
+                    bucket_labels, label_values + (format_value(bound),)
+                )
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {format_value(total[0])}')
+            lines.append(f'{self.name}_count{labels} {counts[-1]}')
+        return lines
+
+
+class CollectedMetric:
+    """
+    Метрика типа kind, значения которой вычисляются
+    в момент сбора функцией collect, возвращающей
+    пары (значения меток, значение).
+    """
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labels: tuple[str, ...],
+            collect: Callable[[], list[tuple[tuple, float]]],
+            kind: str = 'gauge',
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.kind = kind
+        self._collect = collect
+
+    def samples(self) -> list[str]:
+        return [
+            f'{self.name}{format_labels(self.labels, label_values)} '
+            f'{format_value(value)}'
+            for label_values, value in self._collect()
+        ]
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template.',
+    ('method', 'route', 'status'),
+)
+request_db_statements = Histogram(
+    'http_request_db_statements',
+    'Database statements executed per HTTP request.',
+    ('route',),
+    buckets=STATEMENT_BUCKETS,
+)
+request_db_duration = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent in database statements per HTTP request.',
+    ('route',),
+)
+db_statements = Counter(
+    'db_statements_total',
+    'Database statements executed, including background tasks.',
+)
+db_duration = Counter(
+    'db_statement_duration_seconds_total',
+    'Time spent in database statements, including background tasks.',
+)
+
+
+class RequestDbStats:
+    """
+    Количество и время запросов к базе данных
+    в пределах одного HTTP-запроса.
+    """
+
+    __slots__ = ('statements', 'duration')
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.duration = 0.0
+
+
+request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar(
+    'request_db_stats', default=None
+)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters,
+                          context, executemany):
+    conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters,
+                         context, executemany):
+    duration = perf_counter() - conn.info['query_start'].pop()
+    db_statements.inc()
+    db_duration.inc(amount=duration)
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.duration += duration
+
+
+def handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+ENGINE_LISTENERS = {
+    'before_cursor_execute': before_cursor_execute,
+    'after_cursor_execute': after_cursor_execute,
+    'handle_error': handle_error,
+}
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Функция, подключающая к движку обработчики,
+    которые считают запросы и их время.
+    Уже подключенные обработчики не добавляются повторно:
+    при запуске в одном процессе main.py импортируется
+    дважды, как сценарий и как модуль приложения.
+    """
+    for name, listener in ENGINE_LISTENERS.items():
+        if not event.contains(engine, name, listener):
+            event.listen(engine, name, listener)
+
+
+def route_template(scope: dict) -> str:
+    """
+    Функция, возвращающая шаблон пути маршрута,
+    обработавшего запрос, например /{short_url}.
+    Конкретные пути не используются в метках,
+    чтобы их количество не зависело от числа ссылок.
+    """
+    endpoint = scope.get('endpoint')
+    app = scope.get('app')
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    for route in app.routes:
+        if getattr(route, 'endpoint', None) is endpoint:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    ASGI-посредник, замеряющий время обработки
+    HTTP-запросов и количество запросов к базе данных.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stats = RequestDbStats()
+        token = request_db_stats.set(stats)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = perf_counter() - start
+            request_db_stats.reset(token)
+            route = route_template(scope)
+            request_duration.observe(
+                duration, scope['method'], route, str(status)
+            )
+            request_db_statements.observe(stats.statements, route)
+            request_db_duration.observe(stats.duration, route)
+
+
+def runtime_metrics() -> list:
+    """
+    Функция, возвращающая метрики состояния процесса:
+    пула соединений, кэшей, очереди переходов
+    и длительности этапов запуска.
+    """
+    from core.startup import startup_timer
+    from db.pool import pool_metrics
+    from services.clicks import click_recorder
+    from services.logic import resolve_cache, negative_cache, acl_cache
+    from services.passwords import password_hasher
+    from services.shared_cache import shared_cache
+
+    caches = {
+        'resolve': resolve_cache,
+        'negative': negative_cache,
+        'acl': acl_cache,
+        'credentials': password_hasher.verified_cache,
+        'shared': shared_cache,
+    }
+
+    def hit_ratio(cache) -> float:
+        lookups = cache.hits + cache.misses
+        return cache.hits / lookups if lookups else 0.0
+
+    return [
+        CollectedMetric(
+            'db_pool_checkouts_total',
+            'Connections checked out from the pool.',
+            (), lambda: [((), pool_metrics.checkouts)],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'db_pool_timeouts_total',
+            'Connection checkouts that timed out.',
+            (), lambda: [((), pool_metrics.timeouts)],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'db_pool_wait_seconds_total',
+            'Total time spent waiting for pool connections.',
+            (), lambda: [((), pool_metrics.wait_total)],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'db_pool_wait_seconds_max',
+            'Longest wait for a pool connection.',
+            (), lambda: [((), pool_metrics.wait_max)],
+        ),
+        CollectedMetric(
+            'cache_hits_total',
+            'Cache lookups that found an entry.',
+            ('cache',),
+            lambda: [((name,), c.hits) for name, c in caches.items()],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'cache_misses_total',
+            'Cache lookups that found no entry.',
+            ('cache',),
+            lambda: [((name,), c.misses) for name, c in caches.items()],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'cache_hit_ratio',
+            'Share of cache lookups that found an entry.',
+            ('cache',),
+            lambda: [((name,), hit_ratio(c)) for name, c in caches.items()],
+        ),
+        CollectedMetric(
+            'click_queue_depth',
+            'Click events waiting to be written.',
+            (), lambda: [((), click_recorder.depth)],
+        ),
+        CollectedMetric(
+            'click_events_total',
+            'Click events by outcome.',
+            ('outcome',),
+            lambda: [
+                (('flushed',), click_recorder.flushed),
+                (('dropped',), click_recorder.dropped),
+                (('failed',), click_recorder.failed),
+                (('retried',), click_recorder.retried),
+            ],
+            kind='counter',
+        ),
+        CollectedMetric(
+            'startup_phase_seconds',
+            'Duration of process startup phases.',
+            ('phase',),
+            lambda: [
+                ((name,), seconds)
+                for name, seconds in startup_timer.phases.items()
+            ],
+        ),
+    ]
+
+
+def render_metrics() -> str:
+    """
+    Функция, возвращающая все метрики
+    в текстовом формате Prometheus.
+    """
+    lines = []
+    for metric in [
+        request_duration,
+        request_db_statements,
+        request_db_duration,
+        db_statements,
+        db_duration,
+        *runtime_metrics(),
+    ]:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
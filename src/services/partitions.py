@@ -0,0 +1,174 @@
+"""
+Модуль с обслуживанием секций таблицы url_info.
+Таблица секционирована по месяцам по полю action_time:
+секции создаются заранее на CLICK_PARTITION_MONTHS_AHEAD
+месяцев вперед, секции старше CLICK_RETENTION_DAYS дней
+удаляются (drop) или отсоединяются в архив (detach).
+Переходы вне созданных секций попадают в секцию
+url_info_default и переносятся при создании нужной секции.
+
+Пример запуска из каталога src:
+python -m services.partitions
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import (
+    CLICK_PARTITION_MONTHS_AHEAD,
+    CLICK_RETENTION_DAYS,
+    CLICK_RETENTION_MODE,
+    logger,
+)
+from db.db import async_session, engine
+
+PARTITION_PREFIX = 'url_info_p'
+DEFAULT_PARTITION = 'url_info_default'
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.month - 1 + months, 12)
+    return moment.replace(year=moment.year + year, month=month + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f'{PARTITION_PREFIX}{start:%Y%m}'
+
+
+def partition_start(name: str) -> datetime:
+    return datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m')
+
+
+async def get_click_partitions(session: AsyncSession) -> list[str]:
+    """
+    Корутина, возвращающая имена месячных секций url_info
+    в хронологическом порядке.
+    """
+    get_partitions_query = text(
+        "SELECT c.relname FROM pg_inherits AS i "
+        "JOIN pg_class AS c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'url_info'::regclass "
+        "AND c.relname LIKE :pattern "
+        "ORDER BY c.relname"
+    )
+    return (await session.execute(
+        get_partitions_query, {'pattern': f'{PARTITION_PREFIX}%'}
+    )).scalars().all()
+
+
+async def create_click_partition(
+        session: AsyncSession,
+        start: datetime
+) -> None:
+    """
+    Корутина, создающая секцию за месяц, начинающийся в start.
+    Секция создается отдельной таблицей, в нее переносятся
+    переходы за этот месяц из секции по умолчанию,
+    после чего таблица присоединяется к url_info.
+    """
+    name = partition_name(start)
+    bounds = {'start': start, 'end': add_months(start, 1)}
+    await session.execute(text(
+        f'CREATE TABLE {name} '
+        '(LIKE url_info INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    await session.execute(text(
+        f'WITH moved AS ('
+        f'DELETE FROM {DEFAULT_PARTITION} '
+        'WHERE action_time >= :start AND action_time < :end '
+        'RETURNING *'
+        f') INSERT INTO {name} SELECT * FROM moved'
+    ), bounds)
+    await session.execute(text(
+        f"ALTER TABLE url_info ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']:%Y-%m-%d}') "
+        f"TO ('{bounds['end']:%Y-%m-%d}')"
+    ))
+
+
+async def ensure_click_partitions(
+        session: AsyncSession,
+        now: Optional[datetime] = None,
+        months_ahead: int = CLICK_PARTITION_MONTHS_AHEAD,
+) -> list[str]:
+    """
+    Корутина, создающая недостающие секции с текущего
+    месяца на months_ahead месяцев вперед.
+    Возвращает имена созданных секций.
+    """
+    current_month = month_start(now or datetime.utcnow())
+    existing = set(await get_click_partitions(session))
+    created = []
+    for months in range(months_ahead + 1):
+        start = add_months(current_month, months)
+        if partition_name(start) not in existing:
+            await create_click_partition(session, start)
+            created.append(partition_name(start))
+    return created
+
+
+async def drop_expired_click_partitions(
+        session: AsyncSession,
+        now: Optional[datetime] = None,
+        retention_days: int = CLICK_RETENTION_DAYS,
+        mode: str = CLICK_RETENTION_MODE,
+) -> list[str]:
+    """
+    Корутина, удаляющая или отсоединяющая секции,
+    все переходы которых старше retention_days дней.
+    При retention_days == 0 секции хранятся бессрочно.
+    Отсоединенная секция остается отдельной таблицей
+    с тем же именем. Возвращает имена обработанных секций.
+    """
+    if retention_days <= 0:
+        return []
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    expired = [
+        name for name in await get_click_partitions(session)
+        if add_months(partition_start(name), 1) <= cutoff
+    ]
+    for name in expired:
+        if mode == 'detach':
+            await session.execute(
+                text(f'ALTER TABLE url_info DETACH PARTITION {name}')
+            )
+        else:
+            await session.execute(text(f'DROP TABLE {name}'))
+    return expired
+
+
+async def maintain_click_partitions(
+        session: AsyncSession,
+        now: Optional[datetime] = None,
+) -> None:
+    """
+    Корутина, выполняющая обслуживание секций
+    в одной транзакции. Для других СУБД ничего не делает.
+    """
+    if session.bind.dialect.name != 'postgresql':
+        return
+    created = await ensure_click_partitions(session, now)
+    expired = await drop_expired_click_partitions(session, now)
+    await session.commit()
+    logger.info(
+        f'click partitions: created={created} '
+        f'{CLICK_RETENTION_MODE}={expired}'
+    )
+
+
+async def main() -> None:
+    async with async_session() as session:
+        await maintain_click_partitions(session)
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Модуль с хешированием паролей.
+Пароли хешируются функцией scrypt, которая занимает
+десятки миллисекунд, поэтому вычисления выполняются
+в ограниченном пуле потоков (hashlib.scrypt отпускает GIL)
+и не блокируют event loop.
+Успешные проверки запоминаются в кэше на короткое время,
+чтобы повторные переходы не вычисляли хеш заново.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+from base64 import b64encode, b64decode
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from core.config import (
+    PASSWORD_HASH_WORKERS,
+    SCRYPT_N,
+    SCRYPT_R,
+    SCRYPT_P,
+    CREDENTIAL_CACHE_SIZE,
+    CREDENTIAL_CACHE_TTL,
+)
+from services.cache import LRUCache
+
+HASH_ALGORITHM = 'scrypt'
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+
+def hash_password(
+        password: str,
+        n: int = SCRYPT_N,
+        r: int = SCRYPT_R,
+        p: int = SCRYPT_P,
+) -> str:
+    """
+    Функция, возвращающая хеш пароля со случайной солью
+    в виде строки scrypt$n$r$p$соль$хеш.
+    """
+    salt = os.urandom(SALT_SIZE)
+    key = hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=KEY_SIZE,
+        maxmem=256 * n * r,
+    )
+    return '$'.join([
+        HASH_ALGORITHM, str(n), str(r), str(p),
+        b64encode(salt).decode(), b64encode(key).decode(),
+    ])
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """
+    Функция, сравнивающая пароль с хешем
+    за время, не зависящее от совпадения.
+    """
+    try:
+        algorithm, n, r, p, salt, key = password_hash.split('$')
+    except ValueError:
+        return False
+    if algorithm != HASH_ALGORITHM:
+        return False
+    expected_key = b64decode(key)
+    actual_key = hashlib.scrypt(
+        password.encode(), salt=b64decode(salt),
+        n=int(n), r=int(r), p=int(p), dklen=len(expected_key),
+        maxmem=256 * int(n) * int(r),
+    )
+    return hmac.compare_digest(actual_key, expected_key)
+
+
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей в пуле
+    из max_workers потоков с кэшем успешных проверок.
+    Ключ кэша вычисляется HMAC с ключом процесса,
+    поэтому пароли в памяти не хранятся.
+    """
+
+    def __init__(
+            self,
+            max_workers: int,
+            cache_size: int,
+            cache_ttl: float,
+    ) -> None:
+        self.max_workers = max_workers
+        self.verified_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cache_key = os.urandom(32)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='password-hasher',
+            )
+        return self._executor
+
+    def _credentials_key(self, password_hash: str, password: str) -> bytes:
+        return hmac.digest(
+            self._cache_key,
+            f'{password_hash}\0{password}'.encode(),
+            'sha256',
+        )
+
+    async def hash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, hash_password, password
+        )
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Корутина, проверяющая пароль.
+        Пароль, недавно прошедший проверку с тем же хешем,
+        принимается без повторного вычисления scrypt.
+        """
+        credentials_key = self._credentials_key(password_hash, password)
+        if self.verified_cache.get(credentials_key) is not None:
+            return True
+        loop = asyncio.get_running_loop()
+        is_valid = await loop.run_in_executor(
+            self.executor, verify_password, password, password_hash
+        )
+        if is_valid:
+            self.verified_cache.set(credentials_key, True)
+        return is_valid
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=PASSWORD_HASH_WORKERS,
+    cache_size=CREDENTIAL_CACHE_SIZE,
+    cache_ttl=CREDENTIAL_CACHE_TTL,
+)
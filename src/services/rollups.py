@@ -0,0 +1,105 @@
+"""
+Модуль с агрегатами переходов по интервалам времени.
+Агрегаты обновляются при записи каждой пачки переходов,
+поэтому запросы по диапазону времени не читают
+таблицу url_info.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from db.db import dialect_insert
+from models.models import ClickRollup, LongShortUrl
+
+ROLLUP_GRANULARITIES: dict[str, Callable[[datetime], datetime]] = {
+    'minute': lambda moment: moment.replace(second=0, microsecond=0),
+    'hour': lambda moment: moment.replace(
+        minute=0, second=0, microsecond=0),
+    'day': lambda moment: moment.replace(
+        hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+def to_naive_utc(moment: datetime) -> datetime:
+    """
+    Функция, приводящая время к UTC без часового пояса,
+    в котором хранятся отметки времени в базе данных.
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def increment_click_rollups(
+        session: AsyncSession,
+        batch: list[dict[str, Any]]
+) -> None:
+    """
+    Корутина, добавляющая переходы пачки к агрегатам
+    всех интервалов одним upsert-запросом.
+    """
+    clicks_by_bucket = Counter(
+        (event['url_id'], granularity, truncate(event['action_time']),
+         event['link_type'])
+        for event in batch
+        for granularity, truncate in ROLLUP_GRANULARITIES.items()
+    )
+    if not clicks_by_bucket:
+        return
+    upsert_query = dialect_insert(session, ClickRollup).values([
+        {
+            'url_id': url_id,
+            'granularity': granularity,
+            'bucket_start': bucket_start,
+            'link_type': link_type,
+            'clicks': clicks,
+        }
+        for (url_id, granularity, bucket_start, link_type), clicks
+        in sorted(clicks_by_bucket.items())
+    ])
+    upsert_query = upsert_query.on_conflict_do_update(
+        index_elements=[
+            ClickRollup.url_id,
+            ClickRollup.granularity,
+            ClickRollup.bucket_start,
+            ClickRollup.link_type,
+        ],
+        set_={'clicks': ClickRollup.clicks + upsert_query.excluded.clicks}
+    )
+    await session.execute(upsert_query)
+
+
+async def get_click_rollups(
+        short_url: str,
+        session: AsyncSession,
+        granularity: str,
+        from_time: Optional[datetime] = None,
+        to_time: Optional[datetime] = None,
+) -> list[ClickRollup]:
+    """
+    Корутина, возвращающая агрегаты переходов по ссылке
+    за интервал [from_time, to_time) в хронологическом порядке.
+    """
+    get_rollups_query = (
+        select(ClickRollup).
+        join(LongShortUrl, LongShortUrl.id == ClickRollup.url_id).
+        where(
+            LongShortUrl.short_url == short_url,
+            ClickRollup.granularity == granularity,
+        ).
+        order_by(ClickRollup.bucket_start, ClickRollup.link_type)
+    )
+    if from_time is not None:
+        truncate = ROLLUP_GRANULARITIES[granularity]
+        get_rollups_query = get_rollups_query.where(
+            ClickRollup.bucket_start >= truncate(to_naive_utc(from_time))
+        )
+    if to_time is not None:
+        get_rollups_query = get_rollups_query.where(
+            ClickRollup.bucket_start < to_naive_utc(to_time)
+        )
+    return (await session.execute(get_rollups_query)).scalars().all()
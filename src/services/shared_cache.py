@@ -0,0 +1,208 @@
+"""
+Модуль с общим для всех узлов кэшем коротких ссылок в Redis.
+Кэш включается переменной REDIS_URL и дополняет кэши
+процесса: при промахе в памяти ссылка ищется в Redis
+и только затем в базе данных.
+Об изменении ссылок узлы сообщают друг другу через
+канал pub/sub, и каждый узел удаляет устаревшие записи
+своих кэшей, не дожидаясь окончания их времени жизни.
+Ошибки Redis не прерывают обработку запросов:
+обращение к кэшу считается промахом.
+"""
+
+import asyncio
+from typing import Any, Callable, Optional
+
+import orjson
+
+from core.config import (
+    REDIS_URL,
+    SHARED_CACHE_TTL,
+    SHARED_CACHE_PREFIX,
+    SHARED_CACHE_RECONNECT_DELAY,
+    logger,
+)
+
+# Сообщение, которое получают обработчики после потери
+# соединения: пропущенные за это время изменения неизвестны.
+RESET_MESSAGE = {'reset': True}
+
+
+class SharedCache:
+    """
+    Кэш в Redis с ключами вида prefix + ключ
+    и каналом сообщений об изменениях prefix + invalidate.
+    Пока кэш не запущен, get всегда возвращает None,
+    а остальные методы ничего не делают.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str) -> None:
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.channel = f'{prefix}invalidate'
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._reset_broadcast: Optional[asyncio.Task] = None
+        self._handlers: list[Callable[[dict[str, Any]], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self._client is not None
+
+    def subscribe(self, handler: Callable[[dict[str, Any]], None]) -> None:
+        """
+        Добавляет обработчик сообщений об изменениях,
+        в том числе отправленных этим же узлом.
+        """
+        self._handlers.append(handler)
+
+    async def start(self, client=None) -> None:
+        """
+        Корутина, подключающаяся к Redis и подписывающаяся
+        на канал изменений. Вместо подключения по url
+        можно передать готовый клиент redis.asyncio.
+        Если Redis недоступен, кэш остается выключенным.
+        """
+        if client is None:
+            if not self.url:
+                return
+            from redis.asyncio import from_url
+            client = from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.channel)
+        except Exception as e:
+            logger.error(f'SHARED CACHE CONNECT ERROR: {e}')
+            await pubsub.close()
+            await client.close()
+            return
+        self._client = client
+        self._pubsub = pubsub
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f'shared cache started: {self.channel}')
+
+    async def stop(self) -> None:
+        if not self.enabled:
+            return
+        for task in (self._listener, self._reset_broadcast):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._reset_broadcast = None
+        await self._pubsub.close()
+        await self._client.close()
+        self._client = None
+        self._pubsub = None
+        self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    self._dispatch(orjson.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f'SHARED CACHE SUBSCRIPTION ERROR: {e}')
+                self._dispatch(RESET_MESSAGE)
+                await asyncio.sleep(SHARED_CACHE_RECONNECT_DELAY)
+
+    def _dispatch(self, message: dict[str, Any]) -> None:
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f'SHARED CACHE HANDLER ERROR: {e}')
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Корутина, возвращающая значение по ключу либо None,
+        если записи нет или Redis недоступен.
+        """
+        if not self.enabled:
+            return None
+        try:
+            value = await self._client.get(self.prefix + key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f'SHARED CACHE READ ERROR: {e}')
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(value)
+
+    async def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self._client.set(
+                self.prefix + key,
+                orjson.dumps(value),
+                px=int(self.ttl * 1000),
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f'SHARED CACHE WRITE ERROR: {e}')
+
+    async def invalidate(
+            self,
+            message: dict[str, Any],
+            keys: list[str],
+    ) -> None:
+        """
+        Корутина, удаляющая записи keys и рассылающая
+        message всем узлам в одной транзакции Redis.
+        Вызывается после фиксации изменений в базе данных.
+        Если отправить сообщение не удалось, всем узлам
+        рассылается RESET_MESSAGE, как только Redis
+        снова станет доступен.
+        """
+        if not self.enabled:
+            return
+        try:
+            async with self._client.pipeline(transaction=True) as pipeline:
+                if keys:
+                    pipeline.delete(*(self.prefix + key for key in keys))
+                pipeline.publish(self.channel, orjson.dumps(message))
+                await pipeline.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f'SHARED CACHE INVALIDATION ERROR: {e}')
+            self._schedule_reset_broadcast()
+
+    def _schedule_reset_broadcast(self) -> None:
+        if self._reset_broadcast is None or self._reset_broadcast.done():
+            self._reset_broadcast = asyncio.create_task(
+                self._broadcast_reset()
+            )
+
+    async def _broadcast_reset(self) -> None:
+        while True:
+            try:
+                await self._client.publish(
+                    self.channel, orjson.dumps(RESET_MESSAGE)
+                )
+                return
+            except Exception as e:
+                self.errors += 1
+                logger.error(f'SHARED CACHE RESET BROADCAST ERROR: {e}')
+                await asyncio.sleep(SHARED_CACHE_RECONNECT_DELAY)
+
+
+shared_cache = SharedCache(
+    url=REDIS_URL,
+    ttl=SHARED_CACHE_TTL,
+    prefix=SHARED_CACHE_PREFIX,
+)
@@ -0,0 +1,171 @@
+"""
+Модуль со стратегиями генерации коротких ссылок.
+Стратегия выбирается переменной окружения SHORT_CODE_STRATEGY:
+random — случайная строка с повтором при коллизии,
+sequence — кодирование числового идентификатора
+в алфавит CHARACTERS, не требующее повторов.
+"""
+
+import asyncio
+from random import choices
+
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from core.config import (
+    CHARACTERS,
+    SHORT_URL_LENGTH,
+    SHORT_CODE_STRATEGY,
+    SHORT_CODE_BLOCK_SIZE,
+    SEQUENCE_CODE_LENGTH,
+    SHORT_CODE_OBFUSCATE,
+    logger,
+)
+from db.db import async_session, dialect_insert
+from models.models import CodeBlock
+
+# Параметры перестановки x -> (x * A + B) mod N^L.
+# Перестановка взаимно однозначна, пока A не делится на N.
+# Значения нельзя менять после выдачи первых ссылок:
+# иначе новые идентификаторы могут дать уже выданные коды.
+OBFUSCATION_MULTIPLIER = 1_580_030_173
+OBFUSCATION_OFFSET = 918_273_645
+
+
+class RandomCodeGenerator:
+    """
+    Генератор случайных коротких ссылок.
+    Уникальность не гарантируется, при коллизии
+    вызывающий код должен повторить попытку.
+    """
+    is_collision_free = False
+
+    def __init__(self, alphabet: str, length: int) -> None:
+        self.alphabet = alphabet
+        self.length = length
+
+    async def generate(self) -> str:
+        return ''.join(choices(self.alphabet, k=self.length))
+
+
+class IdBlockAllocator:
+    """
+    Выдает идентификаторы из блока, заранее
+    зарезервированного в таблице code_block.
+    Каждый процесс резервирует свой блок одним
+    UPDATE ... RETURNING в отдельной транзакции,
+    поэтому процессы не выдают одинаковых идентификаторов.
+    """
+
+    def __init__(
+            self,
+            session_factory: sessionmaker,
+            name: str,
+            block_size: int,
+    ) -> None:
+        self.session_factory = session_factory
+        self.name = name
+        self.block_size = block_size
+        self._next_id = 0
+        self._block_end = 0
+        self._lock = asyncio.Lock()
+
+    async def next_id(self) -> int:
+        async with self._lock:
+            if self._next_id >= self._block_end:
+                await self._reserve_block()
+            allocated_id = self._next_id
+            self._next_id += 1
+            return allocated_id
+
+    async def _reserve_block(self) -> None:
+        async with self.session_factory() as session:
+            create_query = dialect_insert(session, CodeBlock).values(
+                name=self.name, next_value=0
+            ).on_conflict_do_nothing(index_elements=[CodeBlock.name])
+            await session.execute(create_query)
+            reserve_query = (
+                update(CodeBlock).
+                where(CodeBlock.name == self.name).
+                values(next_value=CodeBlock.next_value + self.block_size).
+                returning(CodeBlock.next_value)
+            )
+            block_end = (await session.execute(reserve_query)).scalar_one()
+            await session.commit()
+        self._next_id = block_end - self.block_size
+        self._block_end = block_end
+        logger.info(f'id block reserved: [{self._next_id}, {block_end})')
+
+
+class SequenceCodeGenerator:
+    """
+    Генератор коротких ссылок из последовательных
+    идентификаторов. Идентификатор при необходимости
+    переставляется взаимно однозначно и записывается
+    в системе счисления с основанием len(alphabet)
+    фиксированной длины, поэтому коды не повторяются.
+    """
+    is_collision_free = True
+
+    def __init__(
+            self,
+            allocator: IdBlockAllocator,
+            alphabet: str,
+            length: int,
+            obfuscate: bool = True,
+    ) -> None:
+        self.allocator = allocator
+        self.alphabet = alphabet
+        self.length = length
+        self.obfuscate = obfuscate
+        self.capacity = len(alphabet) ** length
+
+    def encode(self, value: int) -> str:
+        """
+        Записывает число в алфавите генератора
+        строкой фиксированной длины.
+        """
+        base = len(self.alphabet)
+        digits = []
+        for _ in range(self.length):
+            value, digit = divmod(value, base)
+            digits.append(self.alphabet[digit])
+        return ''.join(reversed(digits))
+
+    def permute(self, value: int) -> int:
+        return (
+            value * OBFUSCATION_MULTIPLIER + OBFUSCATION_OFFSET
+        ) % self.capacity
+
+    async def generate(self) -> str:
+        value = await self.allocator.next_id()
+        if value >= self.capacity:
+            raise OverflowError(
+                f'Short code space of {self.capacity} values is exhausted'
+            )
+        if self.obfuscate:
+            value = self.permute(value)
+        return self.encode(value)
+
+
+def get_code_generator() -> RandomCodeGenerator | SequenceCodeGenerator:
+    """
+    Функция, создающая генератор коротких ссылок
+    в соответствии с SHORT_CODE_STRATEGY.
+    """
+    if SHORT_CODE_STRATEGY == 'sequence':
+        allocator = IdBlockAllocator(
+            session_factory=async_session,
+            name='short_url',
+            block_size=SHORT_CODE_BLOCK_SIZE,
+        )
+        return SequenceCodeGenerator(
+            allocator=allocator,
+            alphabet=CHARACTERS,
+            length=SEQUENCE_CODE_LENGTH,
+            obfuscate=SHORT_CODE_OBFUSCATE,
+        )
+    return RandomCodeGenerator(alphabet=CHARACTERS, length=SHORT_URL_LENGTH)
+
+
+code_generator = get_code_generator()
@@ -0,0 +1,97 @@
+"""
+Модуль с кэшируемой статистикой таблиц
+для эндпоинта /ping/stats.
+"""
+
+import asyncio
+from datetime import datetime
+from time import monotonic
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql.expression import func
+
+from core.config import STATS_REFRESH_INTERVAL, logger
+from models.models import LongShortUrl, UserPassword, LinkAcl, UrlInfo
+
+
+class TableStatsCache:
+    """
+    Кэш количества записей в таблицах.
+    Для PostgreSQL количество берется из оценки
+    pg_class.reltuples, для остальных СУБД и таблиц
+    без собранной статистики выполняется count(*).
+    Autovacuum не анализирует секционированные таблицы,
+    поэтому их оценка складывается из оценок секций,
+    а секции без статистики считаются пустыми:
+    count(*) по журналу переходов не выполняется.
+    Данные обновляются не чаще refresh_interval секунд.
+    """
+
+    def __init__(self, models: list, refresh_interval: float) -> None:
+        self.models = models
+        self.refresh_interval = refresh_interval
+        self._stats: dict[str, str] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._refreshed_at is not None
+            and monotonic() - self._refreshed_at < self.refresh_interval
+        )
+
+    async def get(self, session: AsyncSession) -> dict[str, str]:
+        """
+        Корутина, возвращающая статистику таблиц,
+        при необходимости обновляя её.
+        """
+        if self._is_fresh():
+            return self._stats
+        async with self._lock:
+            if not self._is_fresh():
+                self._stats = await self._collect(session)
+                self._refreshed_at = monotonic()
+        return self._stats
+
+    async def _collect(self, session: AsyncSession) -> dict[str, str]:
+        table_names = [model.__tablename__ for model in self.models]
+        estimates: dict[str, int] = {}
+        if session.bind.dialect.name == 'postgresql':
+            estimates_query = text(
+                "SELECT c.relname, CASE WHEN c.relkind = 'p' THEN ("
+                "SELECT coalesce(sum(greatest(p.reltuples, 0)), 0) "
+                "FROM pg_inherits AS i "
+                "JOIN pg_class AS p ON p.oid = i.inhrelid "
+                "WHERE i.inhparent = c.oid"
+                ") ELSE c.reltuples END::bigint "
+                "FROM pg_class AS c "
+                "WHERE c.relname = ANY(:names) AND c.relkind IN ('r', 'p')"
+            )
+            estimates_query_result = (
+                await session.execute(estimates_query, {'names': table_names})
+            ).all()
+            estimates = {
+                name: cnt for name, cnt in estimates_query_result if cnt >= 0
+            }
+
+        stats = {}
+        for model in self.models:
+            name = model.__tablename__
+            if name in estimates:
+                stats[name] = f'~{estimates[name]} records'
+            else:
+                count_query = select(func.count()).select_from(model)
+                records_cnt = (await session.execute(count_query)).scalar()
+                stats[name] = f'{records_cnt} records'
+        stats['refreshed_at'] = datetime.utcnow().isoformat()
+        logger.debug('table stats refreshed: %s', stats)
+        return stats
+
+
+table_stats = TableStatsCache(
+    models=[LongShortUrl, UserPassword, LinkAcl, UrlInfo],
+    refresh_interval=STATS_REFRESH_INTERVAL,
+)
@@ -0,0 +1,93 @@
+"""
+Модуль с кэшем HTML-шаблонов.
+Шаблоны читаются с диска один раз при запуске
+и заранее разбиваются на текст и подстановки вида
+<NAME>, поэтому отрисовка сводится к склейке строк
+без обращения к файловой системе.
+При TEMPLATES_RELOAD=true шаблон перечитывается,
+если файл изменился.
+"""
+
+import os
+import re
+from html import escape
+from typing import Optional
+
+from core.config import BASE_DIR, NO_PAGE_HTML, TEMPLATES_RELOAD, logger
+
+PLACEHOLDER_PATTERN = re.compile(r'<([A-Z_]+)>')
+
+
+class Template:
+    """
+    Шаблон, разбитый на чередующиеся части:
+    на четных местах текст, на нечетных
+    имена подстановок.
+    """
+
+    def __init__(self, source: str) -> None:
+        self.parts = PLACEHOLDER_PATTERN.split(source)
+
+    @property
+    def placeholders(self) -> set[str]:
+        return set(self.parts[1::2])
+
+    def render(self, **values: str) -> str:
+        """
+        Склеивает шаблон, экранируя подставляемые значения.
+        Значения передаются по именам подстановок.
+        """
+        chunks = self.parts.copy()
+        for i in range(1, len(chunks), 2):
+            chunks[i] = escape(values[chunks[i]])
+        return ''.join(chunks)
+
+
+class TemplateCache:
+    """
+    Кэш шаблонов каталога directory.
+    Все шаблоны из names читаются при создании кэша.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            names: list[str],
+            reload: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.reload = reload
+        self._templates: dict[str, Template] = {}
+        self._mtimes: dict[str, float] = {}
+        for name in names:
+            self._load(name)
+
+    def _load(self, name: str) -> Template:
+        path = os.path.join(self.directory, name)
+        with open(path, 'r') as template_file:
+            self._templates[name] = Template(template_file.read())
+        self._mtimes[name] = os.stat(path).st_mtime
+        logger.debug('template loaded: %s', name)
+        return self._templates[name]
+
+    def get(self, name: str) -> Template:
+        template: Optional[Template] = self._templates.get(name)
+        if template is None:
+            return self._load(name)
+        if self.reload:
+            mtime = os.stat(os.path.join(self.directory, name)).st_mtime
+            if mtime != self._mtimes[name]:
+                return self._load(name)
+        return template
+
+    def render(self, name: str, **values: str) -> str:
+        return self.get(name).render(**values)
+
+
+template_cache = TemplateCache(
+    directory=os.path.join(BASE_DIR, 'templates'),
+    names=['auth_form.html', 'private_link.html'],
+    reload=TEMPLATES_RELOAD,
+)
+
+no_page_html = Template(NO_PAGE_HTML).render()
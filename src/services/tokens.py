@@ -0,0 +1,59 @@
+"""
+Модуль с подписанными токенами сессии.
+Токен содержит имя пользователя и время окончания
+действия и подписан HMAC-SHA256, поэтому проверяется
+без обращения к базе данных.
+Для запуска в нескольких процессах необходимо задать
+общий SESSION_SECRET, иначе каждый процесс использует
+свой случайный ключ.
+"""
+
+import hashlib
+import hmac
+import os
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from time import time
+from typing import Optional
+
+from core.config import SESSION_SECRET, SESSION_TTL, logger
+
+if SESSION_SECRET:
+    secret_key = SESSION_SECRET.encode()
+else:
+    logger.warning('SESSION_SECRET is not set, using a random key')
+    secret_key = os.urandom(32)
+
+
+def sign(payload: bytes) -> str:
+    signature = hmac.digest(secret_key, payload, hashlib.sha256)
+    return urlsafe_b64encode(signature).decode().rstrip('=')
+
+
+def issue_token(username: str, ttl: int = SESSION_TTL) -> str:
+    """
+    Функция, выдающая токен сессии пользователя
+    на ttl секунд.
+    """
+    payload = f'{username}|{int(time()) + ttl}'.encode()
+    return f'{urlsafe_b64encode(payload).decode()}.{sign(payload)}'
+
+
+def read_token(token: Optional[str]) -> Optional[str]:
+    """
+    Функция, возвращающая имя пользователя из токена
+    либо None, если токен подделан, поврежден
+    или срок его действия истек.
+    """
+    if not token:
+        return None
+    try:
+        encoded_payload, signature = token.split('.')
+        payload = urlsafe_b64decode(encoded_payload.encode())
+        if not hmac.compare_digest(sign(payload), signature):
+            return None
+        username, expires_at = payload.decode().rsplit('|', 1)
+        if int(expires_at) < time():
+            return None
+    except ValueError:
+        return None
+    return username
@@ -1,17 +1,76 @@
 """
 Модуль с тестами.
 """
+import asyncio
+import json
+import logging
 import os
+import queue
+from http.cookiejar import DefaultCookiePolicy
+from datetime import datetime
+from uuid import uuid4
 
 from fastapi.testclient import TestClient
+from sqlalchemy import event, update, func, text
+from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.pool import NullPool
 import pytest
 
-from db.db import get_session
+from db.db import get_session, get_read_session
+from db.migrations import get_script_heads, is_schema_up_to_date
+from db.replica import ReplicaRouter
 from models.base import Base
-from main import app
+from models.models import (
+    LinkCounter,
+    UrlInfo,
+    LongShortUrl,
+    UserPassword,
+    LinkAcl,
+)
+from services.bloom import BloomFilter, ShortCodeFilter, short_code_filter
+from services.clicks import (
+    rebuild_click_counters,
+    ClickRecorder,
+    COUNTERS_REBUILD_LOCK,
+)
+from services.partitions import (
+    add_months,
+    ensure_click_partitions,
+    drop_expired_click_partitions,
+    get_click_partitions,
+    partition_name,
+    partition_start,
+)
+from services.shortcodes import SequenceCodeGenerator, IdBlockAllocator
+from services.stats import TableStatsCache
+from services.cache import LRUCache
+from services.templates import TemplateCache
+from services.tokens import issue_token, read_token
+from services.metrics import db_statements, instrument_engine
+from services.logic import (
+    acl_cache,
+    negative_cache,
+    resolve_cache,
+    create_short_url,
+    resolve_short_url,
+    apply_invalidation,
+    register_short_url,
+    check_link_acl,
+)
+from services.shared_cache import SharedCache, shared_cache, RESET_MESSAGE
+from services.passwords import password_hasher
+from core import config
+from core.config import CHARACTERS, MAX_PAGE_SIZE
+from core.logger import (
+    LOG_SAMPLE_RATES,
+    LOGGING,
+    JsonFormatter,
+    LazyQueueHandler,
+    SamplingFilter,
+)
+from main import app, prepare_workers_env, VERSIONS_DIR
 
 
 DSN = os.getenv(
@@ -30,6 +89,7 @@ test_async_session = sessionmaker(
     class_=AsyncSession,
     expire_on_commit=False,
 )
+instrument_engine(test_engine.sync_engine)
 
 
 @pytest.mark.asyncio
@@ -47,7 +107,19 @@ async def override_get_session():
 
 
 app.dependency_overrides[get_session] = override_get_session
+app.dependency_overrides[get_read_session] = override_get_session
 client = TestClient(app)
+# Общий клиент не сохраняет cookie сессии, чтобы вход
+# в одном тесте не открывал приватные ссылки в других.
+client.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+
+def unique_name(prefix: str) -> str:
+    """
+    Функция, возвращающая имя, не повторяющееся между
+    запусками тестов на одной базе данных.
+    """
+    return f'{prefix}_{uuid4().hex[:12]}'
 
 
 def test_root():
@@ -69,6 +141,41 @@ def test_auth():
     assert response.json() == {'message': 'Welcome, some_name!'}
 
 
+@pytest.mark.asyncio
+async def test_password_hashed():
+    username = unique_name('hashed_user')
+    check_auth_point = app.url_path_for('check_auth_data_to_log_in')
+    response = client.post(
+        check_auth_point,
+        json={'username': username, 'password': 'some_password'}
+    )
+    assert response.status_code == 200
+
+    async with test_async_session() as session:
+        password_hash = (await session.execute(
+            select(UserPassword.password_hash).
+            where(UserPassword.username == username)
+        )).scalar()
+    assert password_hash.startswith('scrypt$')
+    assert 'some_password' not in password_hash
+
+    response = client.post(
+        check_auth_point,
+        json={'username': username, 'password': 'wrong_password'}
+    )
+    assert response.status_code == 401
+
+    password_hasher.verified_cache.clear()
+    hits = password_hasher.verified_cache.hits
+    for _ in range(2):
+        response = client.post(
+            check_auth_point,
+            json={'username': username, 'password': 'some_password'}
+        )
+        assert response.status_code == 200
+    assert password_hasher.verified_cache.hits - hits == 1
+
+
 def test_url_shorter():
     make_short_point = app.url_path_for('make_short')
     response = client.post(
@@ -83,11 +190,69 @@ def test_url_shorter():
     assert response.json()['short_link'] != ''
 
 
+@pytest.mark.asyncio
+async def test_concurrent_create_same_url():
+    async def create(i: int) -> str:
+        async with test_async_session() as session:
+            return await create_short_url(
+                url='http://concurrent_url',
+                session=session,
+                creator_name=f'creator_{i}',
+                users_visibility='',
+            )
+
+    short_urls = await asyncio.gather(*(create(i) for i in range(20)))
+    assert len(set(short_urls)) == 1
+
+    async with test_async_session() as session:
+        links = (await session.execute(
+            select(LongShortUrl.short_url, LongShortUrl.is_public).
+            where(LongShortUrl.url == 'http://concurrent_url')
+        )).all()
+        acl_size = (await session.execute(
+            select(func.count()).select_from(LinkAcl).
+            join(LongShortUrl, LongShortUrl.id == LinkAcl.link_id).
+            where(LongShortUrl.url == 'http://concurrent_url')
+        )).scalar()
+    assert links == [(short_urls[0], True)]
+    assert acl_size == 20
+
+
 def test_open_incorrect_url():
     response = client.get('/ldQmvl')
     assert response.status_code == 404
 
 
+def test_unknown_url_negative_cache():
+    negative_cache.clear()
+    response = client.get('/unknwn')
+    assert response.status_code == 404
+    hits = negative_cache.hits
+
+    response = client.get('/unknwn')
+    assert response.status_code == 404
+    assert negative_cache.hits == hits + 1
+
+
+def test_short_code_filter():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    codes = [f'code{i}' for i in range(1000)]
+    for code in codes:
+        bloom_filter.add(code)
+    assert all(code in bloom_filter for code in codes)
+    false_positives = sum(f'miss{i}' in bloom_filter for i in range(1000))
+    assert false_positives < 50
+
+    short_code_filter = ShortCodeFilter(
+        enabled=True, capacity=1000, error_rate=0.01
+    )
+    assert short_code_filter.might_exist('abcdef')
+    short_code_filter.is_ready = True
+    short_code_filter.add('abcdef')
+    assert short_code_filter.might_exist('abcdef')
+    assert not short_code_filter.might_exist('ghijkl')
+
+
 def test_ping_db():
     ping_db_point = app.url_path_for('ping_db')
     response = client.get(ping_db_point)
@@ -96,6 +261,34 @@ def test_ping_db():
     assert response.json()['body']['db_status'] == 'active'
 
 
+def test_metrics():
+    client.get(app.url_path_for('ping_db'))
+    response = client.get(app.url_path_for('get_metrics'))
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith(
+        'text/plain; version=0.0.4')
+    assert (
+        'http_request_duration_seconds_count'
+        '{method="GET",route="/ping",status="200"}'
+    ) in response.text
+    # Каждая проверка /ping выполняет запрос SELECT 1.
+    assert (
+        'http_request_db_statements_bucket{route="/ping",le="0"} 0'
+    ) in response.text
+    assert 'click_queue_depth ' in response.text
+
+
+@pytest.mark.asyncio
+async def test_instrument_engine_is_idempotent():
+    # Движок тестов уже подключен при импорте модуля.
+    instrument_engine(test_engine.sync_engine)
+    statements_before = db_statements._values.get((), 0)
+    async with test_async_session() as session:
+        await session.execute(text('SELECT 1'))
+    assert db_statements._values[()] - statements_before == 1
+
+
 def test_user_status():
     make_short_point = app.url_path_for('make_short')
     response = client.post(
@@ -112,3 +305,864 @@ def test_user_status():
     assert response.json()[0]['body']['short-url'] != ''
     assert response.json()[0]['body']['original-url'] == 'http://some_url'
     assert response.json()[0]['body']['type'] == 'private'
+
+
+def test_private_link_acl():
+    make_short_point = app.url_path_for('make_short')
+    response = client.post(
+        make_short_point,
+        json={
+            'url': 'http://private_url',
+            'creator_name': 'some_name',
+            'users': 'acl_user'
+        }
+    )
+    short_url = response.json()['short_link'].split('/')[-1]
+
+    response = client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 200
+    assert 'http://private_url' not in response.text
+
+    check_auth_point = app.url_path_for('check_auth_data_to_log_in')
+    private_link_point = app.url_path_for('check_auth_data')
+    for username in ('acl_user', 'stranger'):
+        client.post(
+            check_auth_point,
+            json={'username': username, 'password': 'pass'}
+        )
+    response = client.post(
+        private_link_point,
+        json={
+            'username': 'stranger',
+            'password': 'pass',
+            'short_url': short_url
+        }
+    )
+    assert response.status_code == 403
+
+    response = client.post(
+        private_link_point,
+        json={
+            'username': 'acl_user',
+            'password': 'pass',
+            'short_url': short_url
+        }
+    )
+    assert response.status_code == 200
+    assert response.json()['url'] == 'http://private_url'
+
+
+def test_session_token_private_redirect():
+    assert read_token(issue_token('token_user')) == 'token_user'
+    assert read_token(issue_token('token_user', ttl=-1)) is None
+    assert read_token(issue_token('token_user') + 'x') is None
+    assert read_token('garbage') is None
+
+    make_short_point = app.url_path_for('make_short')
+    response = client.post(
+        make_short_point,
+        json={
+            'url': 'http://session_url',
+            'creator_name': 'some_name',
+            'users': 'token_user'
+        }
+    )
+    short_url = response.json()['short_link'].split('/')[-1]
+
+    check_auth_point = app.url_path_for('check_auth_data_to_log_in')
+    private_link_point = app.url_path_for('check_auth_data')
+    session_client = TestClient(app)
+    response = session_client.post(
+        check_auth_point,
+        json={'username': 'token_user', 'password': 'pass'}
+    )
+    assert 'session' in response.cookies
+
+    response = session_client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers['location'] == 'http://session_url'
+
+    response = session_client.post(
+        private_link_point, json={'short_url': short_url}
+    )
+    assert response.status_code == 200
+    assert response.json()['url'] == 'http://session_url'
+
+    session_client.post(
+        check_auth_point,
+        json={'username': 'token_stranger', 'password': 'pass'}
+    )
+    response = session_client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 200
+
+    # Тело без short_url, как у клиентов прежней версии.
+    for body in (
+            {'username': 'token_user', 'password': 'pass'},
+            {'short_url': 1},
+            ['short_url'],
+            {'short_url': short_url, 'username': 1, 'password': 'pass'},
+    ):
+        response = client.post(private_link_point, json=body)
+        assert response.status_code == 422
+
+
+def test_template_cache(tmp_path):
+    template_path = tmp_path / 'page.html'
+    template_path.write_text('<p><NAME></p>')
+    templates = TemplateCache(str(tmp_path), ['page.html'], reload=True)
+    assert templates.render('page.html', NAME='<b>"x"</b>') == (
+        '<p>&lt;b&gt;&quot;x&quot;&lt;/b&gt;</p>'
+    )
+
+    template_path.write_text('<div><NAME></div>')
+    os.utime(template_path, (0, 0))
+    assert templates.render('page.html', NAME='y') == '<div>y</div>'
+
+
+def test_redirect_cache_invalidation():
+    url = f'http://{unique_name("cached_url")}'
+    make_short_point = app.url_path_for('make_short')
+    response = client.post(
+        make_short_point,
+        json={
+            'url': url,
+            'creator_name': 'some_name',
+            'users': ''
+        }
+    )
+    short_url = response.json()['short_link'].split('/')[-1]
+
+    response = client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers['location'] == url
+
+    client.post(
+        make_short_point,
+        json={
+            'url': url,
+            'creator_name': 'some_name',
+            'users': 'somebody'
+        }
+    )
+    response = client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 200
+
+
+def test_cache_generation():
+    cache = LRUCache(maxsize=2, ttl=60)
+    generation = cache.generation('a')
+    cache.invalidate('a')
+    cache.set('a', 1, generation)
+    assert cache.get('a') is None
+    cache.set('a', 1, cache.generation('a'))
+    assert cache.get('a') == 1
+
+    # Поколение вытесненного ключа не возвращается к прежнему.
+    generation = cache.generation('b')
+    cache.invalidate('b')
+    for key in ('c', 'd', 'e'):
+        cache.invalidate(key)
+    cache.set('b', 1, generation)
+    assert cache.get('b') is None
+
+
+@pytest.mark.asyncio
+async def test_resolve_skips_cache_after_concurrent_invalidation():
+    url = f'http://{unique_name("racing_url")}'
+    async with test_async_session() as session:
+        short_url = await create_short_url(
+            url=url, session=session, creator_name='some_name')
+
+    class InvalidatingSession:
+        """
+        Сессия, во время чтения которой другой запрос
+        изменяет ссылку и удаляет её из кэша.
+        """
+
+        def __init__(self, session: AsyncSession) -> None:
+            self.session = session
+
+        async def execute(self, *args, **kwargs):
+            result = await self.session.execute(*args, **kwargs)
+            resolve_cache.invalidate(short_url)
+            return result
+
+    resolve_cache.invalidate(short_url)
+    async with test_async_session() as session:
+        link = await resolve_short_url(short_url, InvalidatingSession(session))
+        assert link.url == url
+        assert resolve_cache.get(short_url) is None
+
+        await resolve_short_url(short_url, session)
+        assert resolve_cache.get(short_url) == link
+
+
+@pytest.mark.asyncio
+async def test_negative_cache_skipped_after_concurrent_create():
+    short_url = unique_name('created')[:20]
+
+    class CreatingSession:
+        """
+        Сессия, во время чтения которой другой запрос
+        создает ссылку с тем же кодом.
+        """
+
+        def __init__(self, session: AsyncSession) -> None:
+            self.session = session
+
+        async def execute(self, *args, **kwargs):
+            result = await self.session.execute(*args, **kwargs)
+            register_short_url(short_url)
+            return result
+
+    async with test_async_session() as session:
+        link = await resolve_short_url(short_url, CreatingSession(session))
+    assert link is None
+    assert negative_cache.get(short_url) is None
+
+
+@pytest.mark.asyncio
+async def test_acl_cache_skipped_after_concurrent_grant():
+    username = unique_name('grantee')
+    async with test_async_session() as session:
+        short_url = await create_short_url(
+            url=f'http://{unique_name("acl_race_url")}',
+            session=session,
+            creator_name='some_name',
+            users_visibility='somebody',
+        )
+        link = await resolve_short_url(short_url, session)
+
+    class GrantingSession:
+        """
+        Сессия, во время чтения которой другой запрос
+        добавляет пользователя в список доступа.
+        """
+
+        def __init__(self, session: AsyncSession) -> None:
+            self.session = session
+
+        async def execute(self, *args, **kwargs):
+            result = await self.session.execute(*args, **kwargs)
+            acl_cache.invalidate((link.url_id, username))
+            return result
+
+    async with test_async_session() as session:
+        assert not await check_link_acl(
+            username, link, GrantingSession(session))
+    assert acl_cache.get((link.url_id, username)) is None
+
+
+def test_clicks_flushed_on_shutdown():
+    make_short_point = app.url_path_for('make_short')
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post(
+            make_short_point,
+            json={
+                'url': f'http://{unique_name("clicked_url")}',
+                'creator_name': 'some_name',
+                'users': ''
+            }
+        )
+        short_url = response.json()['short_link'].split('/')[-1]
+        for _ in range(3):
+            lifespan_client.get(f'/{short_url}', allow_redirects=False)
+
+    response = client.get(f'/{short_url}/status')
+    assert response.json()['body']['count of transitions'] == '3'
+
+
+@pytest.mark.asyncio
+async def test_click_recorder_retries_failed_batch():
+    async with test_async_session() as session:
+        url_id = (await session.execute(
+            select(LongShortUrl.id).limit(1)
+        )).scalar()
+    attempts = 0
+
+    def flaky_session():
+        # Первая попытка записи имитирует недоступность базы данных.
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise ConnectionRefusedError('database is unavailable')
+        return test_async_session()
+
+    recorder = ClickRecorder(
+        session_factory=flaky_session,
+        max_queue_size=10,
+        batch_size=10,
+        flush_interval=60,
+        retries=2,
+        retry_delay=0.01,
+    )
+    recorder.start()
+    for _ in range(2):
+        recorder.record({
+            'url_id': url_id,
+            'link_type': 'public',
+            'action_time': datetime.utcnow(),
+        })
+    await recorder.stop(timeout=5)
+    assert (recorder.flushed, recorder.retried, recorder.failed) == (2, 2, 0)
+
+    attempts = 0
+    recorder.retries = 0
+    recorder.start()
+    recorder.record({
+        'url_id': url_id,
+        'link_type': 'public',
+        'action_time': datetime.utcnow(),
+    })
+    await recorder.stop(timeout=5)
+    assert recorder.failed == 1
+
+
+def test_db_pool_status():
+    db_pool_point = app.url_path_for('get_db_pool_status')
+    response = client.get(db_pool_point)
+    assert response.json()['status_code'] == 200
+    assert response.json()['body']['mode'] == 'null'
+    assert int(response.json()['body']['checkouts']) > 0
+
+
+def test_full_info_cursor_pagination():
+    make_short_point = app.url_path_for('make_short')
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post(
+            make_short_point,
+            json={
+                'url': f'http://{unique_name("paginated_url")}',
+                'creator_name': 'some_name',
+                'users': ''
+            }
+        )
+        short_url = response.json()['short_link'].split('/')[-1]
+        for _ in range(5):
+            lifespan_client.get(f'/{short_url}', allow_redirects=False)
+
+    seen_ids = []
+    cursor = None
+    for expected_cnt in (2, 2, 1):
+        params = {'full_info': True, 'limit': 2}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get(f'/{short_url}/status', params=params)
+        page = response.json()
+        assert len(page) == expected_cnt
+        seen_ids.extend(record['body']['action-id'] for record in page)
+        cursor = response.headers.get('X-Next-Cursor')
+
+    assert len(set(seen_ids)) == 5
+    assert cursor is None
+
+
+def test_user_status_pagination():
+    links_status_point = app.url_path_for('get_links_status')
+    response = client.get(links_status_point, params={'limit': 1})
+    assert len(response.json()) == 1
+
+    for params in (
+            {'limit': 0},
+            {'limit': -1},
+            {'limit': MAX_PAGE_SIZE + 1},
+            {'offset': -1},
+    ):
+        response = client.get(links_status_point, params=params)
+        assert response.status_code == 422
+    for params in ({'offset': -1}, {'limit': MAX_PAGE_SIZE + 1}):
+        response = client.get(
+            '/some_url/status', params={'full_info': True, **params}
+        )
+        assert response.status_code == 422
+
+
+def test_db_stats():
+    db_stats_point = app.url_path_for('get_db_stats')
+    response = client.get(db_stats_point)
+
+    assert response.json()['status_code'] == 200
+    assert response.json()['body']['db_status'] == 'active'
+    assert 'records' in response.json()['body']['long_short_url']
+
+
+@pytest.mark.asyncio
+async def test_partitioned_table_stats_without_count():
+    statements = []
+
+    def remember_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    stats_cache = TableStatsCache(models=[UrlInfo], refresh_interval=0)
+    event.listen(
+        test_engine.sync_engine, 'before_cursor_execute', remember_statement)
+    try:
+        async with test_async_session() as session:
+            stats = await stats_cache.get(session)
+    finally:
+        event.remove(
+            test_engine.sync_engine, 'before_cursor_execute',
+            remember_statement)
+
+    # Секционированная таблица без ANALYZE не имеет своей оценки,
+    # но журнал переходов не должен пересчитываться count(*).
+    assert stats['url_info'].startswith('~')
+    assert not any('count(*)' in statement for statement in statements)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_click_counters():
+    async with test_async_session() as session:
+        await session.execute(update(LinkCounter).values(clicks=0))
+        await session.commit()
+
+        assert await rebuild_click_counters(session)
+
+        clicks = (await session.execute(
+            select(func.sum(LinkCounter.clicks))
+        )).scalar()
+        actions = (await session.execute(
+            select(func.count()).select_from(UrlInfo)
+        )).scalar()
+    assert clicks == actions
+
+
+@pytest.mark.asyncio
+async def test_rebuild_click_counters_single_writer():
+    async with test_async_session() as holder:
+        # Блокировку держит другой процесс-обработчик.
+        await holder.execute(
+            text('SELECT pg_advisory_xact_lock(:key)'),
+            {'key': COUNTERS_REBUILD_LOCK},
+        )
+        async with test_async_session() as session:
+            assert not await rebuild_click_counters(session)
+        await holder.rollback()
+
+
+def test_status_rollups():
+    make_short_point = app.url_path_for('make_short')
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post(
+            make_short_point,
+            json={
+                'url': f'http://{unique_name("rollup_url")}',
+                'creator_name': 'some_name',
+                'users': ''
+            }
+        )
+        short_url = response.json()['short_link'].split('/')[-1]
+        for _ in range(4):
+            lifespan_client.get(f'/{short_url}', allow_redirects=False)
+
+    for granularity in ('minute', 'hour', 'day'):
+        response = client.get(
+            f'/{short_url}/status',
+            params={'granularity': granularity}
+        )
+        buckets = response.json()
+        assert sum(
+            int(bucket['body']['count of transitions']) for bucket in buckets
+        ) == 4
+        assert {bucket['body']['type'] for bucket in buckets} == {'public'}
+
+    response = client.get(
+        f'/{short_url}/status',
+        params={'granularity': 'day', 'from': '2999-01-01T00:00:00'}
+    )
+    assert response.json() == []
+
+    response = client.get(
+        f'/{short_url}/status',
+        params={'granularity': 'week'}
+    )
+    assert response.json()['status_code'] == 400
+
+
+@pytest.mark.asyncio
+async def test_sequence_code_generator():
+    generators = [
+        SequenceCodeGenerator(
+            allocator=IdBlockAllocator(
+                session_factory=test_async_session,
+                name='test_sequence',
+                block_size=3,
+            ),
+            alphabet=CHARACTERS,
+            length=7,
+        )
+        for _ in range(2)
+    ]
+    codes = [
+        await generator.generate()
+        for _ in range(5)
+        for generator in generators
+    ]
+    assert len(set(codes)) == 10
+    assert all(len(code) == 7 for code in codes)
+    assert all(set(code) <= set(CHARACTERS) for code in codes)
+
+
+def test_batch_shorten():
+    make_short_point = app.url_path_for('make_short')
+    response = client.post(
+        make_short_point,
+        json={
+            'url': 'http://batch_url_0',
+            'creator_name': 'some_name',
+            'users': ''
+        }
+    )
+    existing_short_url = response.json()['short_link'].split('/')[-1]
+
+    batch_point = app.url_path_for('make_short_batch')
+    urls = [f'http://batch_url_{i}' for i in range(5)] + ['http://batch_url_1']
+    response = client.post(
+        batch_point,
+        json=[{'original-url': url} for url in urls]
+    )
+    assert response.status_code == 201
+    links = response.json()
+    assert len(links) == 6
+    assert links[0]['short-url'].endswith(f'/{existing_short_url}')
+    assert links[1] == links[5]
+    assert len({link['short-id'] for link in links}) == 5
+
+    short_url = links[3]['short-url'].split('/')[-1]
+    response = client.get(f'/{short_url}', allow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers['location'] == 'http://batch_url_3'
+
+    response = client.post(batch_point, json=[{'url': 'http://batch_url_0'}])
+    assert response.status_code == 422
+
+    invalid_items = [
+        {'original-url': 42},
+        {'original-url': ''},
+        {'original-url': 'http://' + 'a' * 200},
+    ]
+    for item in invalid_items:
+        response = client.post(
+            batch_point,
+            json=[{'original-url': 'http://batch_url_0'}, item]
+        )
+        assert response.status_code == 422
+        assert response.json()['index'] == 1
+
+
+@pytest.mark.asyncio
+async def test_click_partitions_maintenance():
+    async with test_async_session() as session:
+        # Секции создаются за месяцы раньше самой старой
+        # существующей секции, поэтому ни один прошлый
+        # запуск на этой базе данных их не создавал.
+        partitions = await get_click_partitions(session)
+        oldest = (
+            partition_start(partitions[0]) if partitions
+            else datetime(2020, 2, 1)
+        )
+        start = add_months(oldest, -2)
+        first, second = partition_name(start), partition_name(
+            add_months(start, 1))
+
+        url_id = (await session.execute(
+            select(LongShortUrl.id).limit(1)
+        )).scalar()
+        session.add(UrlInfo(
+            url_id=url_id,
+            link_type='public',
+            action_time=start.replace(day=5)
+        ))
+        await session.commit()
+
+        created = await ensure_click_partitions(
+            session, now=start, months_ahead=1
+        )
+        moved = (await session.execute(
+            text(f'SELECT count(*) FROM {first}')
+        )).scalar()
+        expired = await drop_expired_click_partitions(
+            session,
+            now=add_months(start, 2).replace(day=5),
+            retention_days=30,
+            mode='drop',
+        )
+        await session.commit()
+        partitions = await get_click_partitions(session)
+
+    assert created == [first, second]
+    assert moved == 1
+    assert expired == [first]
+    assert first not in partitions
+    assert second in partitions
+
+
+@pytest.mark.asyncio
+async def test_click_recorder_stop_interrupts_flush_wait():
+    async with test_async_session() as session:
+        url_id = (await session.execute(
+            select(LongShortUrl.id).limit(1)
+        )).scalar()
+    recorder = ClickRecorder(
+        session_factory=test_async_session,
+        max_queue_size=10,
+        batch_size=10,
+        flush_interval=60,
+    )
+    recorder.start()
+    recorder.record({
+        'url_id': url_id,
+        'link_type': 'public',
+        'action_time': datetime.utcnow(),
+    })
+    await asyncio.sleep(0.1)
+    await recorder.stop(timeout=5)
+    assert recorder.flushed == 1
+
+
+def test_prepare_workers_env_disables_caches(monkeypatch):
+    names = (
+        'SESSION_SECRET',
+        'BLOOM_FILTER_ENABLED',
+        'RESOLVE_CACHE_SIZE',
+        'NEGATIVE_CACHE_SIZE',
+        'ACL_CACHE_SIZE',
+        'RESOLVE_WARMUP_SIZE',
+    )
+    for name in names:
+        # Переменные восстанавливаются monkeypatch после теста.
+        monkeypatch.setenv(name, '')
+    monkeypatch.setattr(config, 'SESSION_SECRET', 'secret')
+    monkeypatch.setattr(config, 'BLOOM_FILTER_ENABLED', True)
+
+    monkeypatch.setattr(config, 'REDIS_URL', 'redis://localhost')
+    prepare_workers_env(2)
+    assert os.environ['RESOLVE_CACHE_SIZE'] == ''
+    assert os.environ['BLOOM_FILTER_ENABLED'] == ''
+
+    monkeypatch.setattr(config, 'REDIS_URL', '')
+    prepare_workers_env(2)
+    assert os.environ['BLOOM_FILTER_ENABLED'] == 'false'
+    for name in names[2:]:
+        assert os.environ[name] == '0'
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_invalidation():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    other_node = SharedCache(url='', ttl=60, prefix=shared_cache.prefix)
+    await shared_cache.start(
+        client=fakeredis.aioredis.FakeRedis(server=server))
+    await other_node.start(
+        client=fakeredis.aioredis.FakeRedis(server=server))
+    try:
+        async with test_async_session() as session:
+            short_url = await create_short_url(
+                url='http://shared_cache_url',
+                session=session,
+                creator_name='some_name',
+            )
+            # Пока собственное сообщение о создании ссылки
+            # не получено, результат чтения не кэшируется.
+            for _ in range(100):
+                link = await resolve_short_url(short_url, session)
+                if resolve_cache.get(short_url) is not None:
+                    break
+                await asyncio.sleep(0.01)
+        assert await other_node.get(short_url) == list(link)
+
+        await other_node.invalidate(
+            {'short_urls': [short_url]}, keys=[short_url])
+        for _ in range(100):
+            if resolve_cache.get(short_url) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert resolve_cache.get(short_url) is None
+        assert await shared_cache.get(short_url) is None
+
+        class InvalidatingSession:
+            # Сообщение об изменении ссылки приходит во время чтения.
+            def __init__(self, session: AsyncSession) -> None:
+                self.session = session
+
+            async def execute(self, *args, **kwargs):
+                result = await self.session.execute(*args, **kwargs)
+                apply_invalidation({'short_urls': [short_url]})
+                return result
+
+        async with test_async_session() as session:
+            await resolve_short_url(short_url, InvalidatingSession(session))
+        assert await other_node.get(short_url) is None
+    finally:
+        await other_node.stop()
+        await shared_cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_short_code_filter_reloads_after_lost_message(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    # Этот процесс играет роль второго воркера с загруженным
+    # фильтром Блума, other_node - воркера, создающего ссылку.
+    monkeypatch.setattr(short_code_filter, 'enabled', True)
+    async with test_async_session() as session:
+        await short_code_filter.load(session)
+    other_node = SharedCache(url='', ttl=60, prefix=shared_cache.prefix)
+    await shared_cache.start(
+        client=fakeredis.aioredis.FakeRedis(server=server))
+    await other_node.start(
+        client=fakeredis.aioredis.FakeRedis(server=server))
+
+    async def wait_for_reload(short_url: str) -> None:
+        for _ in range(200):
+            if short_code_filter.is_ready and short_url in (
+                    short_code_filter._filter):
+                return
+            await asyncio.sleep(0.01)
+
+    try:
+        short_url = unique_name('lost')[:20]
+        async with test_async_session() as session:
+            session.add(LongShortUrl(
+                url=f'http://{short_url}', short_url=short_url))
+            await session.commit()
+        assert not short_code_filter.might_exist(short_url)
+
+        # Сообщение о создании ссылки не отправлено: Redis
+        # отклонил транзакцию, а затем снова стал доступен.
+        def failing_pipeline(*args, **kwargs):
+            raise ConnectionError('redis is unavailable')
+
+        monkeypatch.setattr(other_node._client, 'pipeline', failing_pipeline)
+        await other_node.invalidate(
+            {'short_urls': [short_url]}, keys=[short_url])
+        await wait_for_reload(short_url)
+        assert short_code_filter.is_ready
+        async with test_async_session() as session:
+            link = await resolve_short_url(short_url, session)
+        assert link.url == f'http://{short_url}'
+
+        # После переподключения подписки фильтр тоже загружается заново.
+        apply_invalidation(RESET_MESSAGE)
+        assert short_code_filter.might_exist(unique_name('missing'))
+        await wait_for_reload(short_url)
+        assert short_code_filter.is_ready
+    finally:
+        await other_node.stop()
+        await shared_cache.stop()
+        short_code_filter.is_ready = False
+
+
+def test_local_caches_disabled_without_shared_cache(monkeypatch):
+    for cache in (resolve_cache, negative_cache, acl_cache):
+        monkeypatch.setattr(cache, 'maxsize', cache.maxsize)
+    monkeypatch.setattr(short_code_filter, 'enabled', True)
+    # Порт 1 закрыт, поэтому подключение к Redis не удается.
+    monkeypatch.setattr(shared_cache, 'url', 'redis://localhost:1')
+    with TestClient(app):
+        assert not shared_cache.enabled
+        assert resolve_cache.maxsize == 0
+        assert negative_cache.maxsize == 0
+        assert acl_cache.maxsize == 0
+        assert not short_code_filter.enabled
+        assert short_code_filter.might_exist(unique_name('code'))
+
+
+def test_logging_pipeline():
+    records = queue.SimpleQueue()
+    test_logger = logging.getLogger('shortener.test')
+    test_logger.propagate = False
+    test_logger.addHandler(LazyQueueHandler(records))
+    test_logger.addFilter(SamplingFilter(rate=0))
+
+    test_logger.info('sampled out %s', 'info')
+    test_logger.warning('short url: %s', 'abc')
+
+    record = records.get_nowait()
+    assert records.empty()
+    # Сообщение не форматируется до вывода из очереди.
+    assert record.args == ('abc',)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['level'] == 'WARNING'
+    assert entry['logger'] == 'shortener.test'
+    assert entry['message'] == 'short url: abc'
+
+    # Журнал доступа uvicorn пишет строку на каждый запрос
+    # и прореживается так же, как события перенаправления.
+    access_filters = LOGGING['loggers']['uvicorn.access']['filters']
+    access_filter = LOGGING['filters'][access_filters[0]]
+    assert access_filter['()'] == 'core.logger.SamplingFilter'
+    assert access_filter['rate'] == LOG_SAMPLE_RATES['uvicorn.access']
+
+
+@pytest.mark.asyncio
+async def test_replica_router():
+    unreachable_engine = create_async_engine(
+        DSN.replace('localhost:1234', 'localhost:1'),
+        poolclass=NullPool,
+        connect_args={'timeout': 1},
+    )
+    unreachable_session = sessionmaker(
+        unreachable_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+    def make_router(replica_factory, max_lag: float = 10) -> ReplicaRouter:
+        return ReplicaRouter(
+            primary_factory=test_async_session,
+            replica_factory=replica_factory,
+            max_lag=max_lag,
+            check_interval=60,
+            check_timeout=1,
+        )
+
+    router = make_router(None)
+    assert await router.get_factory() is test_async_session
+    assert router.state == 'off'
+
+    # База данных, не находящаяся в режиме восстановления,
+    # не отстает, поэтому выбирается как реплика.
+    router = make_router(test_async_session)
+    assert await router.get_factory() is test_async_session
+    assert router.state == 'healthy'
+    assert router.lag == 0
+
+    router = make_router(unreachable_session)
+    assert await router.get_factory() is test_async_session
+    assert router.state == 'unhealthy'
+
+    router = make_router(test_async_session, max_lag=-1)
+    assert await router.get_factory() is test_async_session
+    assert router.state == 'unhealthy'
+    assert router.replica_sessions == 0
+
+
+@pytest.mark.asyncio
+async def test_schema_version_check():
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(Config('alembic.ini'))
+    assert get_script_heads(VERSIONS_DIR) == set(script.get_heads())
+
+    async with test_async_session() as session:
+        # Временная таблица скрывает alembic_version базы данных
+        # и удаляется вместе с соединением.
+        await session.execute(text(
+            'CREATE TEMPORARY TABLE alembic_version (version_num text)'
+        ))
+        assert not await is_schema_up_to_date(session, VERSIONS_DIR)
+
+        await session.execute(
+            text('INSERT INTO alembic_version VALUES (:version)'),
+            {'version': script.get_current_head()},
+        )
+        assert await is_schema_up_to_date(session, VERSIONS_DIR)
+
+        await session.execute(text(
+            "UPDATE alembic_version SET version_num = 'd0d40367ddd5'"
+        ))
+        assert not await is_schema_up_to_date(session, VERSIONS_DIR)
+        await session.rollback()